@@ -2,17 +2,25 @@
 # 目的: 抽出済み JSON（EXTRACT_SCHEMA.json 準拠）を
 #       FNL用テキストとして整形する (Step4)
 
-from typing import Dict, Any, List
-
-
-def _safe(v: Any) -> str:
-    """None を空文字に変換する簡易ヘルパー。"""
-    return "" if v is None else str(v)
-
-
-def _join_nonempty(sep: str, parts: List[str]) -> str:
-    """空文字を除外して結合。"""
-    return sep.join([p for p in parts if p])
+import io
+from typing import Dict, Any
+
+# 航空会社関連の出力順と見出し
+_AIRLINE_FIELDS = (
+    ("meal", "機内食"),
+    ("assist", "搭乗支援"),
+    ("carryOn", "機内持込"),
+    ("arrivalImpact", "到着影響"),
+)
+
+# 装備サイズの出力順（キー, 前置き, 単位）
+_GEAR_FIELDS = (
+    ("top", "服のサイズ", ""),
+    ("bottom", "ズボン", ""),
+    ("shoes", "靴", ""),
+    ("height_cm", "身長", "cm"),
+    ("weight_kg", "体重", "kg"),
+)
 
 
 def render_text(doc: Dict[str, Any]) -> str:
@@ -23,136 +31,125 @@ def render_text(doc: Dict[str, Any]) -> str:
 
     戻り値: FNL用テキスト（複数行）
     """
-    out_lines: List[str] = []
-
     courses = doc.get("courses", [])
     if not courses:
         return ""
 
+    # 行ごとの append + join ではなく、1 つのバッファに直接書き込む
+    buf = io.StringIO()
+    w = buf.write
+
     for c in courses:
+        course_no = c.get("courseNo", "")
+
         # --------------------------------
         # ツアー基本情報
         # --------------------------------
-        out_lines.append("ツアー情報:")
         period = c.get("period", {})
-        out_lines.append(
-            f"- コースNo: {c.get('courseNo', '')} / 期間: "
-            f"{_safe(period.get('start'))}–{_safe(period.get('end'))}"
+        w(
+            "ツアー情報:\n"
+            f"- コースNo: {course_no} / 期間: "
+            f"{period.get('start') or ''}–{period.get('end') or ''}\n"
+            "\n"
         )
-        out_lines.append("")
 
         # --------------------------------
         # 参加者ブロック
         # --------------------------------
         participants = c.get("participants", [])
         if participants:
-            out_lines.append("参加者（該当のみ）:")
+            w("参加者（該当のみ）:\n")
 
         for p in participants:
+            # 参加者ごとに p.get を 1 回だけ引いてローカルに束縛する
+            pg = p.get
+
             # 見出し
-            out_lines.append(
-                f"{c.get('courseNo', '')} No.{p.get('no', '')} "
-                f"{p.get('nameJP', '')} / {p.get('nameEN', '')}（問番:{p.get('inquiryNo', '')}）"
+            w(
+                f"{course_no} No.{pg('no', '')} "
+                f"{pg('nameJP', '')} / {pg('nameEN', '')}（問番:{pg('inquiryNo', '')}）\n"
             )
 
             # 参加形態 (L/O)
-            jt = p.get("joinType") or {}
-            meet = jt.get("meet") or {}
-            flight = jt.get("flight") or {}
-            transfer = jt.get("transfer") or ""
-
+            jt = pg("joinType") or {}
             if jt:
-                seg = (
+                meet = jt.get("meet") or {}
+                flight = jt.get("flight") or {}
+                w(
                     f"- 参加形態: L/O（"
-                    f"合流:{_safe(meet.get('place'))}/{_safe(meet.get('datetime'))} "
-                    f"送迎:{_safe(transfer)} "
-                    f"個人便:{_safe(flight.get('arrive'))}/{_safe(flight.get('depart'))}"
-                    f"）"
+                    f"合流:{meet.get('place') or ''}/{meet.get('datetime') or ''} "
+                    f"送迎:{jt.get('transfer') or ''} "
+                    f"個人便:{flight.get('arrive') or ''}/{flight.get('depart') or ''}"
+                    f"）\n"
                 )
-                out_lines.append(seg)
 
             # ルーミング
-            if p.get("roomingRQ"):
-                out_lines.append(f"- ルーミング要望: {' / '.join(p['roomingRQ'])}")
+            if rooming := pg("roomingRQ"):
+                w(f"- ルーミング要望: {' / '.join(rooming)}\n")
 
             # OP
-            if p.get("optionalRQ"):
-                for op in p["optionalRQ"]:
+            if optional := pg("optionalRQ"):
+                for op in optional:
                     date = op.get("date") or "不明"
                     pax = op.get("pax") or ""
-                    out_lines.append(
-                        f"- オプショナル: {op.get('name', '')} / RQ / {date} / {pax}名"
-                    )
+                    w(f"- オプショナル: {op.get('name', '')} / RQ / {date} / {pax}名\n")
 
             # ハネムーン・入籍・記念日など
-            if p.get("celebration"):
-                out_lines.append(f"- 特別依頼: {' / '.join(p['celebration'])}")
+            if celebration := pg("celebration"):
+                w(f"- 特別依頼: {' / '.join(celebration)}\n")
 
             # 食事・アレルギー
-            if p.get("meal_allergy"):
-                out_lines.append(f"- 食事・アレルギー: {p['meal_allergy']}")
+            if meal_allergy := pg("meal_allergy"):
+                w(f"- 食事・アレルギー: {meal_allergy}\n")
 
             # 医療・介助
-            if p.get("medical"):
-                out_lines.append(f"- 医療・介助: {p['medical']}")
+            if medical := pg("medical"):
+                w(f"- 医療・介助: {medical}\n")
 
             # 航空会社関連
-            al = p.get("airline") or {}
-            al_fields = [
-                ("meal", "機内食"),
-                ("assist", "搭乗支援"),
-                ("carryOn", "機内持込"),
-                ("arrivalImpact", "到着影響"),
-            ]
-            if any(al.get(k) for k, _ in al_fields):
-                out_lines.append("- 航空会社関連:")
-                for k, label in al_fields:
-                    if al.get(k):
-                        out_lines.append(f"  - {label}: {al[k]}")
+            al = pg("airline") or {}
+            if any(al.get(k) for k, _ in _AIRLINE_FIELDS):
+                w("- 航空会社関連:\n")
+                for k, label in _AIRLINE_FIELDS:
+                    if v := al.get(k):
+                        w(f"  - {label}: {v}\n")
 
             # 日程・集合影響
-            if p.get("scheduleImpact"):
-                out_lines.append(f"- 日程・集合影響: {p['scheduleImpact']}")
+            if schedule_impact := pg("scheduleImpact"):
+                w(f"- 日程・集合影響: {schedule_impact}\n")
 
             # バスグループ（※「座席」という語は使わない）
-            if p.get("busSeating"):
+            if bus_seating := pg("busSeating"):
                 # 将来的に「バス班・グループ」用として使う前提。
                 # 座席位置（前方／後方／窓側／通路側）そのものは抽出しない方針。
-                out_lines.append(f"- バスグループ: {p['busSeating']}")
-
-            # 装備サイズ
-            gs = p.get("gearSizes") or {}
-            segs: List[str] = []
-            if gs.get("top"):
-                segs.append(f"服のサイズ{gs['top']}")
-            if gs.get("bottom"):
-                segs.append(f"ズボン{gs['bottom']}")
-            if gs.get("shoes"):
-                segs.append(f"靴{gs['shoes']}")
-            if gs.get("height_cm"):
-                segs.append(f"身長{gs['height_cm']}cm")
-            if gs.get("weight_kg"):
-                segs.append(f"体重{gs['weight_kg']}kg")
-
-            if segs:
-                out_lines.append("- 装備・レンタルサイズ: " + " ".join(segs))
+                w(f"- バスグループ: {bus_seating}\n")
+
+            # 装備サイズ（値のある項目だけを空白区切りで 1 行に書く）
+            gs = pg("gearSizes") or {}
+            sep = "- 装備・レンタルサイズ: "
+            for k, label, unit in _GEAR_FIELDS:
+                if v := gs.get(k):
+                    w(f"{sep}{label}{v}{unit}")
+                    sep = " "
+            if sep == " ":
+                w("\n")
 
             # 別問番同行GRP
-            og_list = p.get("otherGroup") or []
+            og_list = pg("otherGroup") or []
             for og in og_list:
                 room = ""
-                if og.get("roomType"):
-                    room = f" 同室={og['roomType']}"
+                if room_type := og.get("roomType"):
+                    room = f" 同室={room_type}"
                 status = og.get("status") or ""
-                out_lines.append(
+                w(
                     f"- 別問番同行GRP: {og.get('name', '')}/{og.get('inquiryNo', '')}"
-                    f"{room} {status}"
+                    f"{room} {status}\n"
                 )
 
             # 参加者ごとの空行
-            out_lines.append("")
+            w("\n")
 
         # コースごとの区切り
-        out_lines.append("")
+        w("\n")
 
-    return "\n".join(out_lines).strip()
+    return buf.getvalue().strip()
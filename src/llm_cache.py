@@ -0,0 +1,126 @@
+# src/llm_cache.py
+# 目的: LLM 呼び出し結果をディスクにキャッシュする（同一入力の再実行を高速化）
+#
+# 方針:
+# - キーはリクエスト内容（モデル名・メッセージ・response_format）の blake2b ハッシュ
+# - 値は <キャッシュディレクトリ>/<hash>.json に JSON として保存する
+# - 書き込みは一時ファイル → os.replace で原子的に行う
+# - キャッシュディレクトリは環境変数 LAND_FNL_CACHE_DIR で変更可能
+#   （既定: <repo>/.cache/llm）
+# - 環境変数 LAND_FNL_CACHE=0 でキャッシュを無効化できる（本番運用向け。既定は有効）
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import orjson
+
+try:
+    import fcntl
+except ImportError:  # Windows など
+    fcntl = None  # type: ignore
+
+BASE_DIR = pathlib.Path(__file__).resolve().parents[1]
+DEFAULT_CACHE_DIR = BASE_DIR / ".cache" / "llm"
+
+
+def enabled() -> bool:
+    """
+    キャッシュが有効か（LAND_FNL_CACHE が "0" / "false" / "no" / "off" 以外なら有効）。
+    """
+    return os.environ.get("LAND_FNL_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def cache_dir() -> pathlib.Path:
+    """
+    キャッシュディレクトリを返す（LAND_FNL_CACHE_DIR があればそれを優先）。
+    """
+    return pathlib.Path(os.environ.get("LAND_FNL_CACHE_DIR") or DEFAULT_CACHE_DIR)
+
+
+def dumps(value: Any, sort_keys: bool = False) -> bytes:
+    """
+    orjson でコンパクトな JSON (UTF-8 bytes) にする。orjson が扱えない値
+    （64bit を超える整数など）の場合だけ標準の json に同じ形式でフォールバックする。
+    """
+    try:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS if sort_keys else None)
+    except TypeError:  # orjson.JSONEncodeError
+        return json.dumps(
+            value, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":")
+        ).encode("utf-8")
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """
+    chat.completions.create に渡す引数からキャッシュキー（16byte hex）を作る。
+    """
+    return hashlib.blake2b(dumps(request, sort_keys=True), digest_size=16).hexdigest()
+
+
+def load(key: str) -> Optional[Any]:
+    """
+    キャッシュを読み込む。無い・壊れている・キャッシュ無効の場合は None。
+    """
+    if not enabled():
+        return None
+    path = cache_dir() / f"{key}.json"
+    try:
+        return orjson.loads(path.read_bytes())
+    except (OSError, ValueError):  # orjson.JSONDecodeError は ValueError のサブクラス
+        return None
+
+
+def store(key: str, value: Any) -> None:
+    """
+    キャッシュを書き込む。一時ファイルに書いてから os.replace で差し替えるため、
+    読み手が書きかけのファイルを見ることはない。
+    キャッシュ無効の場合は何もしない。
+    """
+    if not enabled():
+        return
+    directory = cache_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    with open(directory / ".lock", "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(dumps(value))
+            os.replace(tmp, directory / f"{key}.json")
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def cached_call(key: str, fn: Callable[[], Any]) -> Any:
+    """
+    キャッシュがあればそれを返し、無ければ fn() を呼んで結果を保存する。
+    """
+    cached = load(key)
+    if cached is not None:
+        return cached
+
+    result = fn()
+    store(key, result)
+    return result
+
+
+async def cached_call_async(key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    cached_call の非同期版。
+    """
+    cached = load(key)
+    if cached is not None:
+        return cached
+
+    result = await fn()
+    store(key, result)
+    return result
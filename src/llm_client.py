@@ -0,0 +1,30 @@
+# src/llm_client.py
+# 目的: OpenAI クライアントをモジュール間で共有する
+#
+# - llm_extractor / llm_validator が同じコネクションプールを使い、
+#   TCP/TLS セッションを呼び出し間で再利用する
+# - HTTP/2 を有効にし、並列リクエストを 1 本の TLS 接続上で多重化する
+# - タイムアウト・接続上限などは openai SDK の既定値
+#   （DefaultHttpxClient / DefaultAsyncHttpxClient）をそのまま使う
+# - 非同期クライアントのコネクションは作成したイベントループに紐づくため、
+#   モジュール共有にはせず、new_async_client で asyncio.run ごとに作って閉じる
+
+from __future__ import annotations
+
+from openai import (  # type: ignore
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    OpenAI,
+)
+
+client = OpenAI(http_client=DefaultHttpxClient(http2=True))
+
+
+def new_async_client() -> AsyncOpenAI:
+    """
+    非同期クライアントを新しく作る。
+    呼び出し側で `async with new_async_client() as aclient:` として使い、
+    同じイベントループの中でだけ共有する（ループをまたいで使い回さない）。
+    """
+    return AsyncOpenAI(http_client=DefaultAsyncHttpxClient(http2=True))
@@ -1,5 +1,5 @@
 # src/llm_extractor.py
-# 目的: 1コース分のブロックから LLM を使って抽出 JSON を生成する (Step2)
+# 目的: コース単位のブロックから LLM を使って抽出 JSON を生成する (Step2)
 #
 # 方針:
 # - 抽出ロジック・禁則ワードなどの指示はすべて
@@ -9,11 +9,21 @@
 
 from __future__ import annotations
 
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, List, AsyncIterator, Optional, Tuple
+import asyncio
+import copy
+import hashlib
 import json
 import pathlib
+import sys
 
-from openai import OpenAI  # type: ignore
+import ijson  # type: ignore
+import orjson
+
+from . import llm_cache
+from .llm_client import client
+from .validator import load_schema
 
 BASE_DIR = pathlib.Path(__file__).resolve().parents[1]
 MASTER_PROMPT_PATH = BASE_DIR / "pack" / "MASTER_PROMPT_v2-rev_20250915.txt"
@@ -21,15 +31,23 @@ MASTER_PROMPT_PATH = BASE_DIR / "pack" / "MASTER_PROMPT_v2-rev_20250915.txt"
 # モデル名（必要に応じて変更）
 DEFAULT_MODEL = "gpt-5.1"
 
-client = OpenAI()
+# 抽出エンジンとしての役割を固定するシステムメッセージ
+SYSTEM_PROMPT = (
+    "あなたは旅行会社のFNL作成を支援する抽出エンジンです。"
+    "EXTRACT_SCHEMA.json に従った JSON オブジェクトのみを返してください。"
+    "入力に別の指定がない限り、トップレベルは {\"courses\": [...]} という構造にし、"
+    "余計な文章や説明文は一切出力してはいけません。"
+)
 
 
+@lru_cache(maxsize=1)
 def load_master_prompt() -> str:
     """
     マスタープロンプトファイルを読み込む。
 
     pack/MASTER_PROMPT_v2-rev_20250915.txt が存在しない場合は例外を投げる。
     （本番運用では必須ファイルとする）
+    読み込み結果はプロセス内でキャッシュし、ファイルは 1 回だけ読む。
     """
     if not MASTER_PROMPT_PATH.exists():
         raise FileNotFoundError(
@@ -38,18 +56,97 @@ def load_master_prompt() -> str:
     return MASTER_PROMPT_PATH.read_text(encoding="utf-8")
 
 
-def build_prompt_for_course(block: Dict[str, Any]) -> str:
+@lru_cache(maxsize=1)
+def _master_prompt_body() -> str:
     """
-    MASTER_PROMPT の末尾に、コースメタ情報と原文をセクションとして付ける。
+    メッセージとして渡すために末尾の空白を落とした MASTER_PROMPT（初回のみ計算）。
+    """
+    return load_master_prompt().rstrip()
 
-    [COURSE_META]
-    [SOURCE_TEXT]
 
-    といったタグで区切ることで、MASTER_PROMPT 側で
-    「どこからどこまでが入力か」を明示しやすくする。
+@lru_cache(maxsize=1)
+def _prompt_cache_key() -> str:
+    """
+    MASTER_PROMPT から作る prompt_cache_key（32 桁 hex）。
+    同じ MASTER_PROMPT を使うリクエストを同じキャッシュに振り分けさせる。
+    """
+    return hashlib.blake2b(
+        _master_prompt_body().encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+def _response_format() -> Dict[str, Any]:
+    """
+    抽出用の response_format を返す。
+
+    EXTRACT_SCHEMA.json を structured outputs の json_schema として渡し、
+    サーバー側でスキーマに沿った出力をさせる。
+    スキーマには任意フィールドが多く strict モードの制約を満たせないため
+    strict=False とし、最終的な検証は validator.validate_schema で行う。
+    """
+    schema = load_schema()
+    if not schema:
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "Courses", "schema": schema, "strict": False},
+    }
+
+
+def _batch_response_format() -> Dict[str, Any]:
+    """
+    バッチ抽出用の response_format を返す。
+
+    {"results": [{"id": <コース番号>, "courses": [...]}, ...]} の形で、
+    courses の各要素は EXTRACT_SCHEMA.json の courses.items をそのまま使う。
+    id で入力ブロックと対応づけるため、欠けたコースだけを個別に再抽出できる。
+    """
+    schema = load_schema()
+    courses_schema = (schema.get("properties") or {}).get("courses")
+    if not courses_schema:
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "BatchResults",
+            "schema": {
+                "type": "object",
+                "required": ["results"],
+                "properties": {
+                    "results": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "required": ["id", "courses"],
+                            "properties": {
+                                "id": {"type": "integer"},
+                                "courses": courses_schema,
+                            },
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+                "additionalProperties": False,
+            },
+            "strict": False,
+        },
+    }
+
+
+def warmup() -> None:
+    """
+    初回リクエストまで遅延している初期化（MASTER_PROMPT・スキーマの読み込み、
+    prompt_cache_key の計算）を先に済ませる。CLI 起動時に入力読み込みと並行して呼ぶ。
     """
-    master = load_master_prompt()
+    _prompt_cache_key()
+    _response_format()
+    _batch_response_format()
 
+
+def _build_course_sections(block: Dict[str, Any]) -> str:
+    """
+    1コース分のブロックを [COURSE_META] / [SOURCE_TEXT] セクションに整形する。
+    """
     course_no = block.get("courseNo", "")
     period = block.get("period") or {}
     period_start = period.get("start", "")
@@ -62,21 +159,122 @@ def build_prompt_for_course(block: Dict[str, Any]) -> str:
         f"期間: {period_start}〜{period_end}\n"
     )
 
-    # 行番号付き原文セクション
-    lines = block.get("lines", [])
-    lines_text = "\n".join(f"{i + 1}: {ln}" for i, ln in enumerate(lines))
+    # 原文セクション
+    # 抽出では行番号を参照しないため付けない（プロンプトのトークン数を抑える）。
+    # 行番号付きの原文は意味検証 (llm_validator) 側でのみ渡す。
+    lines_text = "\n".join(block.get("lines", []))
     source_section = "[SOURCE_TEXT]\n" + lines_text + "\n"
 
-    # MASTER_PROMPT の後ろに入力ブロックを連結
-    prompt = (
-        master.rstrip()
-        + "\n\n"
-        + meta_section
-        + "\n"
-        + source_section
+    return meta_section + "\n" + source_section
+
+
+def build_prompt_for_course(block: Dict[str, Any]) -> str:
+    """
+    コースメタ情報と原文をセクションとして並べた入力メッセージを作る。
+
+    [COURSE_META]
+    [SOURCE_TEXT]
+
+    といったタグで区切ることで、MASTER_PROMPT 側で
+    「どこからどこまでが入力か」を明示しやすくする。
+    MASTER_PROMPT 本体は _build_request で別メッセージとして先頭に置く。
+    """
+    return _build_course_sections(block)
+
+
+def build_prompt_for_courses(blocks: List[Dict[str, Any]]) -> str:
+    """
+    複数コース分のブロックを 1 つのプロンプトにまとめる（バッチ抽出用）。
+
+    各コースは [COURSE id=i]（i は 1 始まり）で区切り、その中に
+    build_prompt_for_course と同じ [COURSE_META] / [SOURCE_TEXT] セクションを置く。
+    出力は {"results": [{"id": i, "courses": [...]}]} とし、id で入力と対応づける。
+    """
+    batch_section = (
+        "[BATCH]\n"
+        f"以下に {len(blocks)} コース分の入力があります。\n"
+        "[COURSE id=i] ごとに独立して抽出し、このリクエストに限りトップレベルを "
+        "{\"results\": [{\"id\": i, \"courses\": [...]}, ...]} としてください。\n"
+        "results には入力 1 コースにつき 1 要素を入れ、id には [COURSE id=i] の i を、"
+        "courses にはそのコースの抽出結果（通常 1 要素）を入れてください。\n"
+        "入力のない id を追加したり、複数コースを 1 要素にまとめてはいけません。\n"
+    )
+
+    course_sections = "\n".join(
+        f"[COURSE id={i + 1}]\n" + _build_course_sections(block)
+        for i, block in enumerate(blocks)
     )
 
-    return prompt
+    return batch_section + "\n" + course_sections
+
+
+def _build_request(
+    prompt: str,
+    model: str,
+    response_format: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    chat.completions.create に渡す引数を組み立てる（同期・非同期で共通）。
+
+    SYSTEM_PROMPT → MASTER_PROMPT → コース入力 の順にメッセージを分け、
+    先頭 2 つを全リクエストで完全に同一にすることで、
+    サーバー側の prefix caching が MASTER_PROMPT 部分に効くようにする。
+    response_format を省略した場合は 1 コース用 (_response_format) を使う。
+    """
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": _master_prompt_body()},
+            {"role": "user", "content": prompt},
+        ],
+        "response_format": response_format or _response_format(),
+        # SDK のバージョンに依存しないよう extra_body 経由で渡す
+        "extra_body": {"prompt_cache_key": _prompt_cache_key()},
+    }
+
+
+def _parse_response(resp: Any) -> Dict[str, Any]:
+    """
+    LLM レスポンスの本文を JSON として読み込む。
+    """
+    content = resp.choices[0].message.content
+    if not content:
+        raise RuntimeError("LLM 抽出結果が空です")
+
+    return orjson.loads(content)
+
+
+def _batch_entry(
+    result: Any,
+    n_blocks: int,
+) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """
+    バッチ抽出の results の 1 要素を (ブロック番号, {"courses": [...]}) に変換する。
+    id が範囲外・courses が配列でないなど対応づけられない要素は None。
+    """
+    if not isinstance(result, dict):
+        return None
+    course_id = result.get("id")
+    courses = result.get("courses")
+    if not isinstance(course_id, int) or not isinstance(courses, list):
+        return None
+    if not 1 <= course_id <= n_blocks:
+        return None
+    return course_id - 1, {"courses": courses}
+
+
+def _warn_fallback(missing: List[int], reason: str) -> None:
+    """
+    バッチ抽出で欠けたコースを個別抽出に切り替えることを stderr に通知する。
+    """
+    ids = ", ".join(str(i + 1) for i in missing)
+    # ijson のエラーメッセージは複数行になるため先頭行だけ使う
+    reason = reason.splitlines()[0] if reason else reason
+    sys.stderr.write(
+        f"[WARN] LLM バッチ抽出で id {ids} の結果が得られませんでした（{reason}）。"
+        "コース単位で再抽出します。\n"
+    )
 
 
 def extract_with_llm(
@@ -90,34 +288,136 @@ def extract_with_llm(
         EXTRACT_SCHEMA.json 準拠を期待した dict。
         実際の検証は validator.validate_schema で行う。
     """
-    prompt = build_prompt_for_course(block)
-
-    resp = client.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "あなたは旅行会社のFNL作成を支援する抽出エンジンです。"
-                    "EXTRACT_SCHEMA.json に従った JSON オブジェクトのみを返してください。"
-                    "トップレベルは {\"courses\": [...]} という構造にし、"
-                    "余計な文章や説明文は一切出力してはいけません。"
-                ),
-            },
-            {
-                "role": "user",
-                "content": prompt,
-            },
-        ],
-        response_format={"type": "json_object"},
+    request = _build_request(build_prompt_for_course(block), model)
+    return llm_cache.cached_call(
+        llm_cache.request_key(request),
+        lambda: _parse_response(client.chat.completions.create(**request)),
     )
 
-    content = resp.choices[0].message.content
-    if not content:
-        raise RuntimeError("LLM 抽出結果が空です")
 
-    data = json.loads(content)
-    return data
+async def extract_with_llm_async(
+    block: Dict[str, Any],
+    aclient: Any,
+    model: str = DEFAULT_MODEL,
+) -> Dict[str, Any]:
+    """
+    extract_with_llm の非同期版。
+    aclient は呼び出し側のイベントループで作った AsyncOpenAI
+    （llm_client.new_async_client）を渡す。
+    """
+    request = _build_request(build_prompt_for_course(block), model)
+
+    async def _call() -> Dict[str, Any]:
+        return _parse_response(await aclient.chat.completions.create(**request))
+
+    return await llm_cache.cached_call_async(llm_cache.request_key(request), _call)
+
+
+async def _iter_stream_results(stream: Any) -> AsyncIterator[Dict[str, Any]]:
+    """
+    ストリーミングレスポンスの本文を ijson で逐次パースし、
+    results 配列の要素を 1 件ずつ揃った時点で yield する。
+    JSON が壊れていた場合は、それまでの要素を yield したうえで RuntimeError。
+    """
+    results = ijson.sendable_list()
+    parser = ijson.items_coro(results, "results.item", use_float=True)
+
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parser.send(delta.encode("utf-8"))
+            for result in results:
+                yield result
+            del results[:]
+
+        parser.close()
+    except ijson.JSONError as e:
+        raise RuntimeError(f"LLM 抽出結果の JSON が不正です: {e}") from e
+    for result in results:
+        yield result
+
+
+async def _iter_list(items: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    キャッシュ済みの results をストリーミング時と同じ形で流すためのヘルパー。
+    """
+    for item in items:
+        yield item
+
+
+async def extract_with_llm_batch_iter(
+    blocks: List[Dict[str, Any]],
+    aclient: Any,
+    sem: asyncio.Semaphore,
+    model: str = DEFAULT_MODEL,
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    複数コース分のブロックを 1 回の LLM 呼び出しでまとめて抽出する（aclient は AsyncOpenAI）。
+
+    レスポンスを stream=True で受け取り、1 コース分が揃うたびに
+    (ブロック番号, {"courses": [...]}) を yield する（順序は到着順）。
+    各要素は extract_with_llm と同じ {"courses": [...]} 形式（1 コース分）。
+    後段（スキーマ検証・意味検証）は全体の生成完了を待たずに開始できる。
+    各ブロック番号はちょうど 1 回ずつ yield される。バッチ結果の JSON が壊れている・
+    id が欠けている場合は、欠けたコースだけ extract_with_llm_async で個別に抽出し直し、
+    揃った順に yield する。個別抽出の同時実行数は sem（呼び出し側と共有）で制限する。
+    全コース分が揃ったバッチ結果は llm_cache に保存し、同じ入力では API を呼ばない。
+    """
+    if not blocks:
+        return
+
+    request = _build_request(
+        build_prompt_for_courses(blocks), model, _batch_response_format()
+    )
+    key = llm_cache.request_key(request)
+
+    cached = llm_cache.load(key)
+    if cached is not None:
+        source = _iter_list(cached.get("results") or [])
+    else:
+        stream = await aclient.chat.completions.create(**request, stream=True)
+        source = _iter_stream_results(stream)
+
+    # yield した結果は後段で書き換えられるため、保存用には複製を持つ
+    received: List[Dict[str, Any]] = []
+    seen = set()
+    reason = "id の欠落"
+    try:
+        async for result in source:
+            entry = _batch_entry(result, len(blocks))
+            if entry is None or entry[0] in seen:
+                continue
+            seen.add(entry[0])
+            received.append(copy.deepcopy(result))
+            yield entry
+    except RuntimeError as e:
+        reason = str(e)
+
+    missing = [i for i in range(len(blocks)) if i not in seen]
+    if not missing:
+        # 全コース分が揃ったバッチ結果だけを保存する
+        # （id が欠けた結果を保存すると、再実行のたびに同じフォールバックが起きる）
+        if cached is None:
+            llm_cache.store(key, {"results": received})
+        return
+
+    _warn_fallback(missing, reason)
+
+    async def _extract_one(i: int) -> Tuple[int, Dict[str, Any]]:
+        async with sem:
+            return i, await extract_with_llm_async(blocks[i], aclient, model)
+
+    tasks = [asyncio.ensure_future(_extract_one(i)) for i in missing]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield await done
+    finally:
+        for t in tasks:
+            t.cancel()
 
 
 if __name__ == "__main__":
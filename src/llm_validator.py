@@ -14,14 +14,71 @@
 
 from __future__ import annotations
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 import json
-from openai import OpenAI  # type: ignore
+import os
 
-# モデル名は必要に応じて変更可
-DEFAULT_MODEL = "gpt-5-mini"
+import orjson
 
-client = OpenAI()
+from . import llm_cache
+from .llm_client import client
+from .safety import NG_RE
+
+# モデル名は環境変数 LAND_FNL_VALIDATOR_MODEL で変更可
+# レビュー結果は小さな JSON なので、既定は軽量・高速なモデルにする
+DEFAULT_MODEL = os.environ.get("LAND_FNL_VALIDATOR_MODEL", "gpt-4o-mini")
+
+# レビュー結果の出力トークン上限
+# 推論モデル（gpt-5-mini 等）では推論トークンもこの上限に含まれるため余裕を持たせる。
+# 上限で打ち切られた場合もパイプラインは止めず、ok=False の警告として返す。
+MAX_REVIEW_TOKENS = 2048
+
+# レビューに渡す原文の最大行数（超える場合は禁則ワードを含む行を優先して残す）
+MAX_REVIEW_LINES = 200
+
+# レビュー結果の JSON スキーマ（structured outputs 用）
+# suggestedPatch は任意構造のため strict モードは使わない
+_ISSUE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["code", "message"],
+    "properties": {
+        "code": {"type": "string"},
+        "message": {"type": "string"},
+        "suggestedPatch": {"type": "object"},
+    },
+}
+REVIEW_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["ok", "errors", "warnings"],
+    "properties": {
+        "ok": {"type": "boolean"},
+        "errors": {"type": "array", "items": _ISSUE_SCHEMA},
+        "warnings": {"type": "array", "items": _ISSUE_SCHEMA},
+    },
+    "additionalProperties": False,
+}
+
+
+def _select_review_lines(lines: List[str]) -> List[Tuple[int, str]]:
+    """
+    レビューに渡す (行番号, 行) を選ぶ。
+
+    MAX_REVIEW_LINES 以内ならすべて渡す。超える場合は
+    禁則ワードを含む行（レイヤー0 の確認対象）を優先して残し、
+    残りの枠を先頭から埋める。行番号と並び順は原文のまま保つ。
+    """
+    numbered = list(enumerate(lines, 1))
+    if len(numbered) <= MAX_REVIEW_LINES:
+        return numbered
+
+    suspicious = [i for i, ln in numbered if NG_RE.search(ln)]
+    keep = set(suspicious[:MAX_REVIEW_LINES])
+    for i, _ in numbered:
+        if len(keep) >= MAX_REVIEW_LINES:
+            break
+        keep.add(i)
+
+    return [(i, ln) for i, ln in numbered if i in keep]
 
 
 def build_validation_prompt(block: Dict[str, Any], extracted_json: Dict[str, Any]) -> str:
@@ -29,13 +86,18 @@ def build_validation_prompt(block: Dict[str, Any], extracted_json: Dict[str, Any
     原文（行番号付き） + 抽出結果 JSON を LLM に渡し、
     内容が妥当かどうかレビューさせるためのプロンプトを組み立てる。
     """
-    # 原文（行番号付き）
-    lines_text = "\n".join(
-        f"{i+1}: {ln}" for i, ln in enumerate(block.get("lines", []))
-    )
+    # 原文（行番号付き・長い場合は一部省略）
+    lines = block.get("lines", [])
+    selected = _select_review_lines(lines)
+    lines_text = "\n".join(f"{i}: {ln}" for i, ln in selected)
+    lines_label = "正規化済み原文（行番号付き）"
+    if len(selected) < len(lines):
+        lines_label += f"・全 {len(lines)} 行中 {len(selected)} 行のみ抜粋"
 
-    # JSON を pretty-print
-    json_text = json.dumps(extracted_json, ensure_ascii=False, indent=2)
+    # JSON はインデントなしのコンパクト形式で渡す（プロンプトのトークン数を抑える）。
+    # キーを整列して、同じ内容なら常に同じ文字列になるようにする。
+    # （64bit を超える整数を含む場合は llm_cache.dumps が標準の json にフォールバックする）
+    json_text = llm_cache.dumps(extracted_json, sort_keys=True).decode("utf-8")
 
     return f"""
 あなたは FNL抽出結果の品質レビュアーです。
@@ -45,7 +107,7 @@ def build_validation_prompt(block: Dict[str, Any], extracted_json: Dict[str, Any
 必要に応じて ERR / WARN を返します。
 schema 構造はすでに Python で検証済みのため変更不要です。
 
-[入力1: 正規化済み原文（行番号付き）]
+[入力1: {lines_label}]
 {lines_text}
 
 [入力2: 抽出結果 JSON]
@@ -101,19 +163,13 @@ schema 構造はすでに Python で検証済みのため変更不要です。
 """.strip()
 
 
-def validate_semantic_with_llm(
-    block: Dict[str, Any],
-    extracted_json: Dict[str, Any],
-    model: str = DEFAULT_MODEL,
-) -> Dict[str, Any]:
+def _build_request(prompt: str, model: str) -> Dict[str, Any]:
     """
-    LLM に意味検証を依頼し、レビュー結果を返す。
+    chat.completions.create に渡す引数を組み立てる（同期・非同期で共通）。
     """
-    prompt = build_validation_prompt(block, extracted_json)
-
-    resp = client.chat.completions.create(
-        model=model,
-        messages=[
+    return {
+        "model": model,
+        "messages": [
             {
                 "role": "system",
                 "content": (
@@ -123,15 +179,99 @@ def validate_semantic_with_llm(
             },
             {"role": "user", "content": prompt},
         ],
-        response_format={"type": "json_object"},
-    )
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "Review", "schema": REVIEW_SCHEMA, "strict": False},
+        },
+        "max_completion_tokens": MAX_REVIEW_TOKENS,
+    }
+
+
+class _ReviewTruncated(RuntimeError):
+    """
+    レビュー結果が MAX_REVIEW_TOKENS で打ち切られたことを表す（キャッシュさせないための内部例外）。
+    """
+
+
+def _truncated_review() -> Dict[str, Any]:
+    """
+    打ち切られたレビューの代わりに返す結果。
+    意味検証は助言的なものなので致命的にはせず、人間の確認を促す警告にする。
+    """
+    return {
+        "ok": False,
+        "errors": [],
+        "warnings": [
+            {
+                "code": "WARN_REVIEW_TRUNCATED",
+                "message": (
+                    f"意味検証の結果が {MAX_REVIEW_TOKENS} トークンで打ち切られたため、"
+                    "レビューを完了できませんでした。抽出結果を目視で確認してください。"
+                ),
+            }
+        ],
+    }
+
 
-    content = resp.choices[0].message.content
+def _parse_response(resp: Any) -> Dict[str, Any]:
+    """
+    LLM レスポンスの本文を JSON として読み込む。
+    出力が上限で打ち切られていた場合は _ReviewTruncated を送出する。
+    """
+    choice = resp.choices[0]
+    if choice.finish_reason == "length":
+        raise _ReviewTruncated(
+            f"LLM semantic validation was truncated at {MAX_REVIEW_TOKENS} tokens"
+        )
+
+    content = choice.message.content
     if not content:
         raise RuntimeError("LLM semantic validation returned empty content")
 
-    result = json.loads(content)
-    return result
+    return orjson.loads(content)
+
+
+def validate_semantic_with_llm(
+    block: Dict[str, Any],
+    extracted_json: Dict[str, Any],
+    model: str = DEFAULT_MODEL,
+) -> Dict[str, Any]:
+    """
+    LLM に意味検証を依頼し、レビュー結果を返す。
+    同じ入力のレビュー結果は llm_cache から返す。
+    出力が上限で打ち切られた場合は ok=False の警告を返す（キャッシュはしない）。
+    """
+    request = _build_request(build_validation_prompt(block, extracted_json), model)
+    try:
+        return llm_cache.cached_call(
+            llm_cache.request_key(request),
+            lambda: _parse_response(client.chat.completions.create(**request)),
+        )
+    except _ReviewTruncated:
+        return _truncated_review()
+
+
+async def validate_semantic_with_llm_async(
+    block: Dict[str, Any],
+    extracted_json: Dict[str, Any],
+    aclient: Any,
+    model: str = DEFAULT_MODEL,
+) -> Dict[str, Any]:
+    """
+    validate_semantic_with_llm の非同期版。
+    aclient は呼び出し側のイベントループで作った AsyncOpenAI
+    （llm_client.new_async_client）を渡す。
+    """
+    request = _build_request(build_validation_prompt(block, extracted_json), model)
+
+    async def _call() -> Dict[str, Any]:
+        resp = await aclient.chat.completions.create(**request)
+        return _parse_response(resp)
+
+    try:
+        return await llm_cache.cached_call_async(llm_cache.request_key(request), _call)
+    except _ReviewTruncated:
+        return _truncated_review()
 
 
 if __name__ == "__main__":
@@ -3,13 +3,40 @@
 # このモジュールは Step0 に相当し、Python ルールベースで前処理を行う。
 
 import re
+import sys
 import unicodedata
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterable, Iterator, List
+
+# 正規化・ブロック化で使う正規表現（モジュール読み込み時に 1 回だけコンパイル）
+# 空白の連続（またはタブ）を 1 つの半角スペースにまとめる。
+# 単独の半角スペースは置換不要なのでマッチさせない（[ \t]+ と同じ結果で、置換回数が減る）
+_WS_RE = re.compile(r"\t[ \t]*| [ \t]+")
+_EOL_RE = re.compile(r"\r\n?")
+# 削除対象の行: 装飾線だけの行 / Page x/y を含む行
+# 規則は下の 2 つのパターンだけで定義し、全文用と 1 行用の正規表現をそこから作る
+_DECOR_PAT = r"[-_=]{4,}"
+_PAGE_PAT = r"Page \d+/\d+"
+# 全文に対して使う（normalize_lines）
+_DROP_RE = re.compile(
+    rf"^[^\S\n]*{_DECOR_PAT}[^\S\n]*$|^.*{_PAGE_PAT}.*$", re.M | re.I
+)
+# 1 行ずつ処理する場合（iter_normalized_lines）の削除判定（strip 済みの行に対して使う）
+_DECOR_LINE_RE = re.compile(_DECOR_PAT)
+_PAGE_LINE_RE = re.compile(_PAGE_PAT, re.I)
+_COURSE_RE = re.compile(r"(コースNo|Course)[:：]?\s*([A-Za-z0-9\-]+)")
+_PERIOD_RE = re.compile(r"(\d{4}-\d{2}-\d{2}).*?(\d{4}-\d{2}-\d{2})")
+
+# この長さ未満の行は sys.intern して、同じ内容の行で文字列を共有する
+_INTERN_MAX_LEN = 64
 
 
 def z2h(s: str) -> str:
     """
     全角 → 半角 正規化 (NFKC)
+
+    unicodedata.normalize は ASCII のみ・正規化済みの文字列を内部の
+    クイックチェックで素通しするため、translate 表などの前処理は挟まない
+    （日本語を含む文字列では str.translate の方が NFKC 本体より遅い）。
     """
     return unicodedata.normalize("NFKC", s)
 
@@ -25,33 +52,37 @@ def normalize_lines(raw: str) -> List[str]:
     """
     s = z2h(raw)
 
-    # 改行コード統一
-    s = s.replace("\r\n", "\n").replace("\r", "\n")
+    # 連続スペース圧縮（全角スペースは z2h で半角になっている）
+    s = _WS_RE.sub(" ", s)
+
+    # 改行コード統一（^ / $ が全ての行頭・行末に効くようにする）
+    s = _EOL_RE.sub("\n", s)
 
-    # 連続スペース圧縮・全角スペース除去
-    s = re.sub(r"[ \t]+", " ", s)
-    s = re.sub(r"\u3000+", " ", s)
+    # 装飾線（----、____、==== など）とページ表記の行を、全文に対する 1 回の置換で消す
+    s = _DROP_RE.sub("", s)
 
-    # 余計な連続改行は 2 個までにする
-    s = re.sub(r"\n{3,}", "\n\n", s)
+    return [t for ln in s.split("\n") if (t := ln.strip())]
 
-    lines = [ln.strip() for ln in s.split("\n") if ln.strip()]
 
-    cleaned: List[str] = []
+def iter_normalized_lines(lines: Iterable[str]) -> Iterator[str]:
+    """
+    normalize_lines の逐次版。行のイテラブル（開いたファイルなど）を受け取り、
+    正規化済みの行を 1 行ずつ返す。入力全体をメモリに載せずに処理できる。
+
+    結果は同じ内容の文字列に normalize_lines を適用した場合と一致する。
+    """
     for ln in lines:
-        # 装飾線（----、____、==== など）
-        if re.fullmatch(r"[-_=]{4,}", ln):
+        # 行末の改行・前後の空白は最後の strip でまとめて落とす
+        t = _WS_RE.sub(" ", z2h(ln)).strip()
+        if not t:
             continue
-        # ページ表記
-        if re.search(r"Page \d+/\d+", ln, flags=re.I):
+        # 装飾線だけの行 / Page x/y を含む行は捨てる
+        if _DECOR_LINE_RE.fullmatch(t) or _PAGE_LINE_RE.search(t):
             continue
+        yield t
 
-        cleaned.append(ln)
-
-    return cleaned
 
-
-def find_course_blocks(lines: List[str]) -> List[Dict[str, Any]]:
+def find_course_blocks(lines: Iterable[str]) -> List[Dict[str, Any]]:
     """
     コース単位のブロックを抽出する。
     戻り値は、以下の構造のリスト。
@@ -65,6 +96,7 @@ def find_course_blocks(lines: List[str]) -> List[Dict[str, Any]]:
     ポイント:
     - 「コースNo が検出されていないブロック」は blocks に追加しない。
       → 冒頭のヘッダだけの BLOCK-1 などを作らない。
+    - period はコース内で最初に見つかった日付範囲を採用する。
     """
     blocks: List[Dict[str, Any]] = []
 
@@ -77,7 +109,8 @@ def find_course_blocks(lines: List[str]) -> List[Dict[str, Any]]:
 
     for ln in lines:
         # コース No 検出
-        m_course = re.search(r"(コースNo|Course)[:：]?\s*([A-Za-z0-9\-]+)", ln)
+        # （「コースNo」「Course」のどちらも含み得ない行は正規表現を通さない）
+        m_course = _COURSE_RE.search(ln) if ("コ" in ln or "C" in ln) else None
         if m_course:
             # 直前のブロックに courseNo が入っていれば、1コースとして確定させる
             if cur["courseNo"]:
@@ -91,17 +124,21 @@ def find_course_blocks(lines: List[str]) -> List[Dict[str, Any]]:
             }
 
         # 期間検出（例: 2025-09-01〜2025-09-05）
-        m_period = re.search(r"(\d{4}-\d{2}-\d{2}).*?(\d{4}-\d{2}-\d{2})", ln)
-        if m_period and cur["courseNo"]:
-            cur["period"] = {
-                "start": m_period.group(1),
-                "end": m_period.group(2),
-            }
+        # コース内で最初に見つかった期間を採用し、以降の行では探さない
+        # （便名・OP 日付など後続行の日付で上書きしない）
+        if cur["courseNo"] and not cur["period"]["start"]:
+            m_period = _PERIOD_RE.search(ln)
+            if m_period:
+                cur["period"] = {
+                    "start": m_period.group(1),
+                    "end": m_period.group(2),
+                }
 
         # 現在のブロックに行を追加
         # （まだ courseNo が見つかっていないヘッダ行は捨てる）
+        # 短い行は見出し・定型文の繰り返しが多いため intern して共有する
         if cur["courseNo"]:
-            cur["lines"].append(ln)
+            cur["lines"].append(sys.intern(ln) if len(ln) < _INTERN_MAX_LEN else ln)
 
     # ループ終了後、最後のブロックに courseNo があれば追加
     if cur["courseNo"] and cur["lines"]:
@@ -5,27 +5,35 @@
 #   入力テキスト
 #     → 正規化 (normalize_lines)
 #     → コース単位ブロック化 (find_course_blocks)
-#     → LLM抽出 (extract_with_llm)
+#     → LLM抽出 (extract_with_llm_batch_iter: 全コースを 1 回の呼び出しで抽出し、
+#                コースごとにストリーミングで後段へ渡す)
 #     → スキーマ検証 (validate_schema)
-#     → 意味検証 (validate_semantic_with_llm)
+#     → 意味検証 (validate_semantic_with_llm_async: コース単位で並列実行)
 #     → 整形テキスト化 (render_text)
-#     → 禁則ワードチェック (contains_ng_terms)
+#     → 禁則ワードチェック (scan_ng_terms)
 #
 # 使い方:
 #   python3 -m src.pipeline input.txt
 
 from __future__ import annotations
 
+import asyncio
+import io
 import sys
 import pathlib
-from typing import Any, Dict, List
+import threading
+from typing import Any, Dict, Iterable, List, Tuple, Union
 
-from .normalizer import normalize_lines, find_course_blocks
-from .llm_extractor import extract_with_llm
+from .normalizer import normalize_lines, iter_normalized_lines, find_course_blocks
+from .llm_extractor import extract_with_llm_batch_iter, warmup
 from .validator import validate_schema
-from .llm_validator import validate_semantic_with_llm
+from .llm_validator import validate_semantic_with_llm_async
 from .formatter import render_text
-from .safety import contains_ng_terms, find_all_ng_terms
+from .llm_client import new_async_client
+from .safety import scan_ng_terms
+
+# LLM 呼び出し（意味検証・抽出のフォールバック）の同時実行数の上限（レートリミット対策）
+MAX_CONCURRENT_REQUESTS = 8
 
 
 def _print_review_report(all_reviews: List[Dict[str, Any]]) -> None:
@@ -39,7 +47,10 @@ def _print_review_report(all_reviews: List[Dict[str, Any]]) -> None:
     if not all_reviews:
         return
 
-    sys.stderr.write("\n=== Semantic Review Report (for human check) ===\n")
+    # 1 行ずつ書き込むと小さな write が大量に発生するため、まとめて 1 回で出力する
+    buf = io.StringIO()
+    w = buf.write
+    w("\n=== Semantic Review Report (for human check) ===\n")
     for item in all_reviews:
         course_no = item.get("courseNo", "UNKNOWN")
         review = item.get("review", {}) or {}
@@ -47,62 +58,113 @@ def _print_review_report(all_reviews: List[Dict[str, Any]]) -> None:
         errors = review.get("errors") or []
         warnings = review.get("warnings") or []
 
-        sys.stderr.write(f"\n[Course: {course_no}] ok = {ok}\n")
+        w(f"\n[Course: {course_no}] ok = {ok}\n")
 
         if errors:
-            sys.stderr.write("  Errors:\n")
+            w("  Errors:\n")
             for e in errors:
                 code = e.get("code", "")
                 msg = e.get("message", "")
-                sys.stderr.write(f"    - {code}: {msg}\n")
+                w(f"    - {code}: {msg}\n")
 
         if warnings:
-            sys.stderr.write("  Warnings:\n")
-            for w in warnings:
-                code = w.get("code", "")
-                msg = w.get("message", "")
-                sys.stderr.write(f"    - {code}: {msg}\n")
+            w("  Warnings:\n")
+            for wn in warnings:
+                code = wn.get("code", "")
+                msg = wn.get("message", "")
+                w(f"    - {code}: {msg}\n")
+
+    sys.stderr.write(buf.getvalue())
+    sys.stderr.flush()
 
 
-def process_text(raw: str) -> str:
+async def _process_course(
+    aclient: Any,
+    sem: asyncio.Semaphore,
+    course_no: str,
+    block: Dict[str, Any],
+    extracted: Dict[str, Any],
+) -> Dict[str, Any]:
     """
-    生テキスト文字列から FNL 用の最終テキストを生成するメイン処理。
-    エラーがあれば例外を投げる。
+    1コース分の検証（スキーマ検証 → 意味検証）を行い、レビュー結果を返す。
+    意味検証の LLM 呼び出しは sem で同時実行数を制限する。
+    参加者が空のコースは意味検証を省略し、ok=True のレビューを返す。
     """
-    # Step0: 正規化
-    lines = normalize_lines(raw)
+    # Step3a: 構造検証 (jsonschema)
+    try:
+        validate_schema(extracted)
+    except Exception as e:
+        # コース単位でどこが壊れているか分かるようにする
+        raise RuntimeError(
+            f"Schema validation failed for course {course_no}: {e}"
+        ) from e
 
-    # Step0: コース単位ブロック化
-    blocks = find_course_blocks(lines)
+    # Step3b: 意味検証 (LLMレビュー)
+    # 参加者が 1 人もいないコースはレビュー対象の項目が無いため LLM を呼ばない。
+    # （禁則ワードは最終 Step の scan_ng_terms で引き続き検出される）
+    if not any(c.get("participants") for c in extracted.get("courses", [])):
+        return {"ok": True, "errors": [], "warnings": []}
+
+    try:
+        async with sem:
+            review = await validate_semantic_with_llm_async(block, extracted, aclient)
+    except Exception as e:
+        # 意味検証自体ができなかった場合は致命的とみなして例外
+        raise RuntimeError(
+            f"Semantic validation call failed for course {course_no}: {e}"
+        ) from e
+
+    return review
+
+
+async def _process_blocks(
+    aclient: Any,
+    blocks: List[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    全コースブロックの抽出〜検証を行い、(courses, reviews) を返す。
+    意味検証はコース単位で並列に実行し、結果は入力順に並べる。
+    LLM 呼び出しにはすべて aclient（このイベントループで作った AsyncOpenAI）を使う。
+    """
+    course_nos = [
+        block.get("courseNo") or f"BLOCK-{idx+1}" for idx, block in enumerate(blocks)
+    ]
+    extracted_by_idx: Dict[int, Dict[str, Any]] = {}
+
+    # Step2: LLM抽出（全コースをまとめて 1 回で抽出）
+    # ストリーミングで 1 コース分が揃うたびに、Step3 の検証をタスクとして開始する
+    # （到着順は入力順と限らないため、ブロック番号で管理する）
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    tasks_by_idx: Dict[int, "asyncio.Task[Dict[str, Any]]"] = {}
+    try:
+        async for idx, extracted in extract_with_llm_batch_iter(blocks, aclient, sem):
+            extracted_by_idx[idx] = extracted
+            tasks_by_idx[idx] = asyncio.create_task(
+                _process_course(aclient, sem, course_nos[idx], blocks[idx], extracted)
+            )
+    except BaseException:
+        # 抽出の途中で失敗したら、開始済みの検証タスクを止めてから例外を伝える
+        for t in tasks_by_idx.values():
+            t.cancel()
+        await asyncio.gather(*tasks_by_idx.values(), return_exceptions=True)
+        raise
+
+    extracted_list = [extracted_by_idx[i] for i in range(len(blocks))]
+    tasks = [tasks_by_idx[i] for i in range(len(blocks))]
+
+    # 検証は全コース分を待ち、失敗があれば入力順で最初のものを送出する
+    # （完了順に依存せず、同じ入力なら同じエラーになる）
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for r in results:
+        if isinstance(r, BaseException):
+            raise r
+    reviews: List[Dict[str, Any]] = list(results)  # type: ignore[arg-type]
 
     all_courses: List[Dict[str, Any]] = []
     all_reviews: List[Dict[str, Any]] = []
+    warn_buf = io.StringIO()
 
-    # 各コースブロックごとに抽出〜検証
-    for idx, block in enumerate(blocks):
-        course_no = block.get("courseNo") or f"BLOCK-{idx+1}"
-
-        # Step2: LLM抽出
-        extracted = extract_with_llm(block)
-
-        # Step3a: 構造検証 (jsonschema)
-        try:
-            validate_schema(extracted)
-        except Exception as e:
-            # コース単位でどこが壊れているか分かるようにする
-            raise RuntimeError(
-                f"Schema validation failed for course {course_no}: {e}"
-            ) from e
-
-        # Step3b: 意味検証 (LLMレビュー)
-        try:
-            review = validate_semantic_with_llm(block, extracted)
-        except Exception as e:
-            # 意味検証自体ができなかった場合は致命的とみなして例外
-            raise RuntimeError(
-                f"Semantic validation call failed for course {course_no}: {e}"
-            ) from e
-
+    for course_no, extracted, review in zip(course_nos, extracted_list, reviews):
         # レビュー結果を集約（後で人間が読む用）
         all_reviews.append(
             {
@@ -111,28 +173,59 @@ def process_text(raw: str) -> str:
             }
         )
 
-        # ok=False の場合は警告のみ（処理は継続）
+        # ok=False の場合は警告のみ（処理は継続）。出力はループ後にまとめて行う
         if not review.get("ok", True):
-            sys.stderr.write(
+            warn_buf.write(
                 f"[WARN] Semantic validation not OK for course {course_no}:\n"
+                f"  errors: {review.get('errors')}\n"
+                f"  warnings: {review.get('warnings')}\n"
             )
-            sys.stderr.write(f"  errors: {review.get('errors')}\n")
-            sys.stderr.write(f"  warnings: {review.get('warnings')}\n")
 
         # courses 配列を統合
         course_list = extracted.get("courses", [])
         all_courses.extend(course_list)
 
+    if warn_buf.tell():
+        sys.stderr.write(warn_buf.getvalue())
+        sys.stderr.flush()
+
+    return all_courses, all_reviews
+
+
+async def process_text_async(raw: Union[str, Iterable[str]]) -> str:
+    """
+    process_text の非同期版。既にイベントループが動いている環境
+    （Web サーバ・ノートブック等）からはこちらを await する。
+    """
+    # Step0: 正規化
+    # 文字列は全文まとめて、行のイテラブル（開いたファイル等）は 1 行ずつ正規化する
+    if isinstance(raw, str):
+        lines: Iterable[str] = normalize_lines(raw)
+    else:
+        lines = iter_normalized_lines(raw)
+
+    # Step0: コース単位ブロック化
+    blocks = find_course_blocks(lines)
+
+    # Step2〜3: LLM抽出・検証
+    all_courses: List[Dict[str, Any]] = []
+    all_reviews: List[Dict[str, Any]] = []
+    # 非同期クライアントは呼び出しごとに作って閉じる
+    # （コネクションがイベントループに紐づくため、asyncio.run をまたいで共有しない）
+    if blocks:
+        async with new_async_client() as aclient:
+            all_courses, all_reviews = await _process_blocks(aclient, blocks)
+
     # Step4: 整形 (テキストレンダリング)
     payload = {"courses": all_courses}
     text = render_text(payload)
 
-    # 最終 Step: 禁則ワードチェック（二重バリア）
-    if contains_ng_terms(text):
-        hits = find_all_ng_terms(text)
+    # 最終 Step: 禁則ワードチェック（二重バリア・1 回の走査で全件を拾う）
+    hits = scan_ng_terms(text)
+    if hits:
         raise SystemExit(
             "NGワード（座席・保険・金銭など）が出力に含まれています。"
-            f" 該当: {', '.join(set(hits))}"
+            f" 該当: {', '.join(sorted(hits))}"
         )
 
     # レビュー結果を stderr にまとめて表示（本文とは分離）
@@ -141,6 +234,15 @@ def process_text(raw: str) -> str:
     return text
 
 
+def process_text(raw: Union[str, Iterable[str]]) -> str:
+    """
+    生テキスト（文字列、または開いたファイルなど行のイテラブル）から
+    FNL 用の最終テキストを生成するメイン処理。
+    エラーがあれば例外を投げる。
+    """
+    return asyncio.run(process_text_async(raw))
+
+
 def main() -> None:
     """
     CLI エントリポイント。
@@ -154,8 +256,15 @@ def main() -> None:
     if not path.exists():
         raise SystemExit(f"input file not found: {path}")
 
-    raw = path.read_text(encoding="utf-8")
-    result = process_text(raw)
+    # LLM 呼び出し前の初期化を、入力ファイルの読み込み・正規化と並行して済ませる
+    warmup_thread = threading.Thread(target=warmup, daemon=True)
+    warmup_thread.start()
+
+    # 入力は全体を読み込まず、1 行ずつ正規化・ブロック化に流す
+    with path.open(encoding="utf-8", buffering=1 << 16) as f:
+        result = process_text(f)
+    warmup_thread.join()
+
     print(result)
 
 
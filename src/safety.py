@@ -3,39 +3,68 @@
 # LLM抽出前のプロンプトでも除外するが、二重バリアとしてPython側でも確認する
 
 import re
-from typing import List
+from typing import List, Optional, Set
+
+import ahocorasick  # type: ignore
 
 # 禁則ワード一覧
 # 必要に応じて pack/MASTER_PROMPT に合わせて増やして良い
-NG_PATTERNS: List[str] = [
-    r"座席",
-    r"並び席",
-    r"保険",
-    r"返金",
-    r"金銭",
-    r"旅券",
+# - LITERAL_TERMS: そのまま部分一致で探す文字列（Aho-Corasick で 1 回の走査にまとめる）
+# - REGEX_TERMS:   単語境界など正規表現が必要なもの
+LITERAL_TERMS: List[str] = [
+    "座席",
+    "並び席",
+    "保険",
+    "返金",
+    "金銭",
+    "旅券",
+    "社内進行",
+]
+REGEX_TERMS: List[str] = [
     r"\bJR\b",
-    r"社内進行",
 ]
 
+# 全パターンを正規表現として並べたもの（プロンプトや行単位の判定用）
+NG_PATTERNS: List[str] = [re.escape(t) for t in LITERAL_TERMS] + REGEX_TERMS
+
+# 全パターンを 1 つの正規表現にまとめたもの（1 回の走査で「どれかに該当するか」を判定する）
+NG_RE: "re.Pattern[str]" = re.compile("|".join(f"(?:{p})" for p in NG_PATTERNS))
+
+_REGEX_RE: Optional["re.Pattern[str]"] = (
+    re.compile("|".join(f"(?:{p})" for p in REGEX_TERMS)) if REGEX_TERMS else None
+)
+
+_AUTOMATON = ahocorasick.Automaton()
+for _term in LITERAL_TERMS:
+    _AUTOMATON.add_word(_term, _term)
+_AUTOMATON.make_automaton()
+
+
+def scan_ng_terms(text: str) -> Set[str]:
+    """
+    テキスト中の禁則ワードを探し、見つかったものの集合を返す（無ければ空集合）。
+    リテラルは Aho-Corasick、正規表現は結合済みパターンでそれぞれ 1 回ずつ走査する。
+    """
+    hits = {term for _, term in _AUTOMATON.iter(text)}
+    if _REGEX_RE is not None:
+        hits.update(_REGEX_RE.findall(text))
+    return hits
+
 
 def contains_ng_terms(text: str) -> bool:
     """
-    テキスト中に禁則ワードが含まれている場合 True。
+    テキスト中に禁則ワードが含まれている場合 True（scan_ng_terms のラッパー）。
     """
-    return any(re.search(pat, text) for pat in NG_PATTERNS)
+    return bool(scan_ng_terms(text))
 
 
 def find_all_ng_terms(text: str) -> List[str]:
     """
-    発見された禁則ワードをすべて返す（デバッグ用）。
+    発見された禁則ワードを返す（デバッグ用・scan_ng_terms のラッパー）。
+    パターン 1 つにつき 1 件、NG_PATTERNS の順（リテラル → 正規表現）に並べる。
     """
-    hits = []
-    for pat in NG_PATTERNS:
-        m = re.search(pat, text)
-        if m:
-            hits.append(m.group(0))
-    return hits
+    hits = scan_ng_terms(text)
+    return [t for t in LITERAL_TERMS if t in hits] + sorted(hits.difference(LITERAL_TERMS))
 
 
 if __name__ == "__main__":
@@ -1,15 +1,63 @@
 # src/validator.py
 # 目的: EXTRACT_SCHEMA.json によるスキーマ検証 (Python 3.9 対応版)
 
-import json
 import pathlib
-from typing import Any, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Callable, Optional, Tuple
 
-from jsonschema import Draft202012Validator, ValidationError
+import orjson
+from jsonschema.validators import validator_for
+
+try:
+    import fastjsonschema
+except ImportError:  # 未インストール時は jsonschema のみで検証する
+    fastjsonschema = None  # type: ignore
 
 BASE_DIR = pathlib.Path(__file__).resolve().parents[1]
 SCHEMA_PATH = BASE_DIR / "pack" / "EXTRACT_SCHEMA.json"
 
+# course 直下に現れる period の別名 (開始キー, 終了キー)。先にある方を優先する
+_PERIOD_ALIAS_PAIRS: Tuple[Tuple[str, str], ...] = (
+    ("periodFrom", "periodTo"),
+    ("periodStart", "periodEnd"),
+    ("startDate", "endDate"),
+)
+_PERIOD_ALIAS_KEYS = frozenset(k for pair in _PERIOD_ALIAS_PAIRS for k in pair)
+
+# airline の LLM 側のキー → schema のキーの対応 (src, dst)
+# assistance / support → assist
+# baggage / luggage → carryOn
+# impact → arrivalImpact
+_AIRLINE_KEY_MAP: Tuple[Tuple[str, str], ...] = (
+    ("assistance", "assist"),
+    ("support", "assist"),
+    ("baggage", "carryOn"),
+    ("luggage", "carryOn"),
+    ("impact", "arrivalImpact"),
+)
+
+# airline に残してよいキー（schema で定義されているもの）
+_AIRLINE_ALLOWED = frozenset({"meal", "assist", "carryOn", "arrivalImpact"})
+
+
+def _coerce_participant_numbers(p: dict) -> None:
+    """
+    1人分の participant について coerce_numeric_fields の変換を行う。
+    """
+    # isdecimal は int() が受け付ける数字だけで True になる
+    # （isdigit だと "²" なども True になり int() で ValueError になる）
+
+    # no: "01" → 1
+    no = p.get("no")
+    if type(no) is str and no.isdecimal():
+        p["no"] = int(no)
+
+    # optionalRQ[].pax: "2" → 2
+    for op in p.get("optionalRQ") or ():
+        pax = op.get("pax")
+        if type(pax) is str and pax.isdecimal():
+            op["pax"] = int(pax)
+
 
 def coerce_numeric_fields(doc: dict) -> dict:
     """
@@ -17,24 +65,56 @@ def coerce_numeric_fields(doc: dict) -> dict:
     - participants[].no
     - participants[].optionalRQ[].pax
     """
-    courses = doc.get("courses", [])
+    courses = doc.get("courses", ())
     for course in courses:
-        participants = course.get("participants", []) or []
+        participants = course.get("participants") or ()
         for p in participants:
-            # no: "01" → 1
-            no = p.get("no")
-            if isinstance(no, str) and no.isdigit():
-                p["no"] = int(no)
-
-            # optionalRQ[].pax: "2" → 2
-            for op in p.get("optionalRQ", []) or []:
-                pax = op.get("pax")
-                if isinstance(pax, str) and pax.isdigit():
-                    op["pax"] = int(pax)
+            _coerce_participant_numbers(p)
 
     return doc
 
 
+def _normalize_course_fields(course: dict) -> None:
+    """
+    1コース分について normalize_course_structure の補正を行う。
+    """
+    # 1) period 配下に participants がいるパターンを補正（念のため）
+    period = course.get("period")
+    if isinstance(period, dict) and "participants" in period and "participants" not in course:
+        course["participants"] = period.pop("participants")
+
+    # 2) period の別名をまとめて拾う
+    # 優先順位: 既に period がある場合はそれを優先し、足りない方だけ補完する
+    period_obj = course.get("period") or {}
+    start_val = period_obj.get("start")
+    end_val = period_obj.get("end")
+
+    # いろいろな別名から start / end を拾う（別名が 1 つも無いコースは素通し）
+    if not _PERIOD_ALIAS_KEYS.isdisjoint(course):
+        for start_key, end_key in _PERIOD_ALIAS_PAIRS:
+            # 使った別名は消しておく
+            s = course.pop(start_key, None)
+            e = course.pop(end_key, None)
+            if s and not start_val:
+                start_val = s
+            if e and not end_val:
+                end_val = e
+
+    # 何かしら start / end が取れていれば period をセット
+    # （既に同じ内容の {"start", "end"} になっている場合は作り直さない）
+    if start_val or end_val:
+        start_out = start_val or ""
+        end_out = end_val or ""
+        if not (
+            len(period_obj) == 2
+            and "start" in period_obj
+            and "end" in period_obj
+            and period_obj["start"] == start_out
+            and period_obj["end"] == end_out
+        ):
+            course["period"] = {"start": start_out, "end": end_out}
+
+
 def normalize_course_structure(doc: dict) -> dict:
     """
     LLM の出力構造のゆがみを補正する。
@@ -45,49 +125,24 @@ def normalize_course_structure(doc: dict) -> dict:
       startDate / endDate がある場合、
       period: {"start": ..., "end": ...} に正規化する。
     """
-    courses = doc.get("courses", [])
+    courses = doc.get("courses", ())
     for course in courses:
-        # 1) period 配下に participants がいるパターンを補正（念のため）
-        period = course.get("period")
-        if isinstance(period, dict) and "participants" in period and "participants" not in course:
-            course["participants"] = period.pop("participants")
-
-        # 2) period の別名をまとめて拾う
-        # 優先順位: 既に period がある場合はそれを優先し、足りない方だけ補完する
-        period_obj = course.get("period") or {}
-        start_val = period_obj.get("start")
-        end_val = period_obj.get("end")
-
-        # いろいろな別名から start / end を拾う
-        alias_pairs = [
-            ("periodFrom", "periodTo"),
-            ("periodStart", "periodEnd"),
-            ("startDate", "endDate"),
-        ]
-
-        for start_key, end_key in alias_pairs:
-            s = course.get(start_key)
-            e = course.get(end_key)
-            if s and not start_val:
-                start_val = s
-            if e and not end_val:
-                end_val = e
-            # 使った別名は消しておく
-            if start_key in course:
-                course.pop(start_key, None)
-            if end_key in course:
-                course.pop(end_key, None)
-
-        # 何かしら start / end が取れていれば period をセット
-        if start_val or end_val:
-            course["period"] = {
-                "start": start_val or "",
-                "end": end_val or "",
-            }
+        _normalize_course_fields(course)
 
     return doc
 
 
+def _clean_participant_optionalrq(p: dict) -> None:
+    """
+    1人分の participant について clean_optionalrq_status の削除を行う。
+    """
+    opt_list = p.get("optionalRQ") or ()
+    for op in opt_list:
+        # status の無い要素（大半）は in の判定だけで次へ進む
+        if isinstance(op, dict) and "status" in op:
+            del op["status"]
+
+
 def clean_optionalrq_status(doc: dict) -> dict:
     """
     optionalRQ の各要素から、スキーマに存在しない status フィールドを削除する。
@@ -96,14 +151,11 @@ def clean_optionalrq_status(doc: dict) -> dict:
     返してくることがあるが、EXTRACT_SCHEMA.json では status を定義していない
     ため、ここで取り除く。
     """
-    courses = doc.get("courses", [])
+    courses = doc.get("courses", ())
     for course in courses:
-        participants = course.get("participants", []) or []
+        participants = course.get("participants") or ()
         for p in participants:
-            opt_list = p.get("optionalRQ", []) or []
-            for op in opt_list:
-                if isinstance(op, dict) and "status" in op:
-                    op.pop("status", None)
+            _clean_participant_optionalrq(p)
     return doc
 
 
@@ -119,6 +171,36 @@ def _to_str(val: Any) -> str:
     return str(val)
 
 
+def _normalize_participant_text(p: dict) -> None:
+    """
+    1人分の participant について normalize_text_fields の正規化を行う。
+    """
+    # participant直下の文字列フィールド
+    if "meal_allergy" in p:
+        p["meal_allergy"] = _to_str(p.get("meal_allergy"))
+    if "medical" in p:
+        p["medical"] = _to_str(p.get("medical"))
+    if "scheduleImpact" in p:
+        p["scheduleImpact"] = _to_str(p.get("scheduleImpact"))
+
+    # airline オブジェクト
+    al = p.get("airline")
+    if isinstance(al, dict):
+        # LLM 側のキーを schema のキーにマッピング
+        for src, dst in _AIRLINE_KEY_MAP:
+            if src in al and dst not in al:
+                al[dst] = al.pop(src)
+            else:
+                al.pop(src, None)
+
+        # _AIRLINE_ALLOWED 以外のキーは削除しつつ、値を string に統一
+        for key in list(al.keys()):
+            if key in _AIRLINE_ALLOWED:
+                al[key] = _to_str(al.get(key))
+            else:
+                al.pop(key, None)
+
+
 def normalize_text_fields(doc: dict) -> dict:
     """
     LLM が list などで返してくる文字列フィールドを、スキーマに合わせて正規化する。
@@ -132,49 +214,29 @@ def normalize_text_fields(doc: dict) -> dict:
       - impact → arrivalImpact
       - 各値は string に統一（list は " / " で join）
     """
-    courses = doc.get("courses", [])
+    courses = doc.get("courses", ())
     for course in courses:
-        participants = course.get("participants", []) or []
+        participants = course.get("participants") or ()
         for p in participants:
-            # participant直下の文字列フィールド
-            if "meal_allergy" in p:
-                p["meal_allergy"] = _to_str(p.get("meal_allergy"))
-            if "medical" in p:
-                p["medical"] = _to_str(p.get("medical"))
-            if "scheduleImpact" in p:
-                p["scheduleImpact"] = _to_str(p.get("scheduleImpact"))
-
-            # airline オブジェクト
-            al = p.get("airline")
-            if isinstance(al, dict):
-                # LLM 側のキーを schema のキーにマッピング
-                # assistance / support → assist
-                # baggage / luggage → carryOn
-                # impact → arrivalImpact
-                key_map = {
-                    "assistance": "assist",
-                    "support": "assist",
-                    "baggage": "carryOn",
-                    "luggage": "carryOn",
-                    "impact": "arrivalImpact",
-                }
-                for src, dst in key_map.items():
-                    if src in al and dst not in al:
-                        al[dst] = al.pop(src)
-                    else:
-                        al.pop(src, None)
-
-                # allowed 以外のキーは削除しつつ、値を string に統一
-                allowed = {"meal", "assist", "carryOn", "arrivalImpact"}
-                for key in list(al.keys()):
-                    if key in allowed:
-                        al[key] = _to_str(al.get(key))
-                    else:
-                        al.pop(key, None)
+            _normalize_participant_text(p)
 
     return doc
 
 
+def _normalize_participant_gear(p: dict) -> None:
+    """
+    1人分の participant について normalize_gear_sizes の正規化を行う。
+    """
+    if "gearSizes" not in p:
+        return
+    gs = p.get("gearSizes")
+    # 期待通り dict ならそのまま
+    if isinstance(gs, dict):
+        return
+    # list や str など dict 以外はすべて空オブジェクトに正規化
+    p["gearSizes"] = {}
+
+
 def normalize_gear_sizes(doc: dict) -> dict:
     """
     gearSizes フィールドをスキーマに合わせて object に正規化する。
@@ -182,65 +244,137 @@ def normalize_gear_sizes(doc: dict) -> dict:
     - gearSizes が list や None 等、dict 以外の型のときは {} に置き換える。
       （装備サイズ情報なし、という扱い）
     """
-    courses = doc.get("courses", [])
+    courses = doc.get("courses", ())
     for course in courses:
-        participants = course.get("participants", []) or []
+        participants = course.get("participants") or ()
         for p in participants:
-            if "gearSizes" not in p:
-                continue
-            gs = p.get("gearSizes")
-            # 期待通り dict ならそのまま
-            if isinstance(gs, dict):
-                continue
-            # list や str など dict 以外はすべて空オブジェクトに正規化
-            p["gearSizes"] = {}
+            _normalize_participant_gear(p)
     return doc
 
 
-# スキーマの読み込みとバリデータ初期化
-try:
-    _schema: dict = json.loads(SCHEMA_PATH.read_text(encoding="utf-8"))
-except FileNotFoundError:
-    _schema = {}
-    _validator = None
-else:
-    _validator = Draft202012Validator(_schema)
+def _normalize_once(doc: dict) -> dict:
+    """
+    検証前の正規化（構造補正 → OP status 削除 → 文字列フィールド正規化 →
+    gearSizes 正規化 → 数値フィールド補正）を、courses → participants の
+    1 回の走査でまとめて行う。個別の normalize_* を順に呼ぶのと同じ結果になる。
+    何度呼んでも結果は変わらない（冪等）。
+
+    optionalRQ は status 削除と pax 補正を 1 回のループでまとめて行い、
+    各要素を 1 度だけ見る。
+    """
+    courses = doc.get("courses", ())
+    for course in courses:
+        _normalize_course_fields(course)
+        participants = course.get("participants") or ()
+        for p in participants:
+            # optionalRQ[]: status 削除 + pax: "2" → 2
+            for op in p.get("optionalRQ") or ():
+                if isinstance(op, dict) and "status" in op:
+                    del op["status"]
+                pax = op.get("pax")
+                if type(pax) is str and pax.isdecimal():
+                    op["pax"] = int(pax)
+
+            _normalize_participant_text(p)
+            _normalize_participant_gear(p)
+
+            # no: "01" → 1
+            no = p.get("no")
+            if type(no) is str and no.isdecimal():
+                p["no"] = int(no)
+
+    return doc
+
+
+@lru_cache(maxsize=1)
+def load_schema() -> dict:
+    """
+    EXTRACT_SCHEMA.json を読み込む（プロセス内で 1 回だけ）。
+    ファイルが無い場合は空 dict を返す。
+    llm_extractor の response_format もこの結果から作る（検証と同じスキーマを使う）。
+    """
+    try:
+        return orjson.loads(SCHEMA_PATH.read_bytes())
+    except FileNotFoundError:
+        return {}
+
+
+@lru_cache(maxsize=1)
+def _get_validator() -> Optional[Any]:
+    """
+    スキーマの $schema に合ったバリデータを初回呼び出し時に 1 回だけ作る。
+    スキーマが無い場合は None。
+    """
+    schema = load_schema()
+    if not schema:
+        return None
+    return validator_for(schema)(schema)
+
+
+@lru_cache(maxsize=1)
+def _get_fast_validator() -> Optional[Callable[[Any], Any]]:
+    """
+    fastjsonschema でスキーマから検証関数を生成する（初回のみ）。
+    fastjsonschema が無い・スキーマを扱えない場合は None（jsonschema のみで検証）。
+    """
+    schema = load_schema()
+    if not schema or fastjsonschema is None:
+        return None
+    try:
+        return fastjsonschema.compile(schema)
+    except fastjsonschema.JsonSchemaDefinitionException:
+        return None
+
+
+def _passes_fast_check(doc: dict) -> bool:
+    """
+    生成済みの検証関数で doc を検証する。適合すれば True。
+    不適合・生成できなかった場合は False（jsonschema で検証し直す）。
+    """
+    fast = _get_fast_validator()
+    if fast is None:
+        return False
+    try:
+        fast(doc)
+    except fastjsonschema.JsonSchemaValueException:
+        return False
+    return True
 
 
 def validate_schema(doc: dict) -> None:
     """
     EXTRACT_SCHEMA.json による機械的な検証を行う。
-    スキーマが未ロード（_schema が空）の場合は何もしない。
+    スキーマが未ロード（ファイルが無い）の場合は何もしない。
     """
-    if not _schema or _validator is None:
+    validator = _get_validator()
+    if validator is None:
         return
 
     # 構造補正 → OP status 削除 → 文字列フィールド正規化 → gearSizes 正規化 → 数値フィールド補正
-    doc = normalize_course_structure(doc)
-    doc = clean_optionalrq_status(doc)
-    doc = normalize_text_fields(doc)
-    doc = normalize_gear_sizes(doc)
-    doc = coerce_numeric_fields(doc)
+    doc = _normalize_once(doc)
 
-    _validator.validate(doc)
+    # 通常は生成済みの検証関数だけで済ませる。不適合の場合のみ jsonschema で
+    # 検証し直し、従来どおり ValidationError（エラー箇所の詳細付き）を送出する
+    if _passes_fast_check(doc):
+        return
+    validator.validate(doc)
 
 
 def is_schema_valid(doc: dict) -> Tuple[bool, Optional[str]]:
     """
     スキーマに適合するかをチェックし、(bool, エラーメッセージ) を返す。
     スキーマ未設定時は (True, None) を返す。
+    最初のエラーが見つかった時点で検証を打ち切る。
     """
-    if not _schema or _validator is None:
+    validator = _get_validator()
+    if validator is None:
         return True, None
 
-    doc = normalize_course_structure(doc)
-    doc = clean_optionalrq_status(doc)
-    doc = normalize_text_fields(doc)
-    doc = normalize_gear_sizes(doc)
-    doc = coerce_numeric_fields(doc)
+    doc = _normalize_once(doc)
 
-    try:
-        _validator.validate(doc)
+    if _passes_fast_check(doc):
+        return True, None
+    error = next(validator.iter_errors(doc), None)
+    if error is None:
         return True, None
-    except ValidationError as e:
-        return False, str(e)
+    return False, str(error)
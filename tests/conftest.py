@@ -0,0 +1,57 @@
+# tests/conftest.py
+# 目的: テスト共通の設定と、chat.completions を差し替える偽クライアント
+#
+# - OPENAI_API_KEY が無くても src.llm_client のクライアントを生成できるようにする
+# - LLM キャッシュはテストごとの一時ディレクトリに向け、実行環境のキャッシュを汚さない
+
+import os
+from types import SimpleNamespace
+from typing import Any, AsyncIterator
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")  # クライアント生成用のダミー
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("LAND_FNL_CACHE_DIR", str(tmp_path / "llm"))
+    monkeypatch.delenv("LAND_FNL_CACHE", raising=False)
+
+
+def chat_response(content: str, finish_reason: str = "stop") -> SimpleNamespace:
+    """
+    chat.completions.create（非ストリーミング）のレスポンスの偽物。
+    """
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=message, finish_reason=finish_reason)]
+    )
+
+
+async def chat_stream(text: str, size: int = 7) -> AsyncIterator[SimpleNamespace]:
+    """
+    stream=True のレスポンスの偽物。本文を size 文字ずつ delta として流す
+    （先頭に choices 無しのチャンクも混ぜる）。
+    """
+    yield SimpleNamespace(choices=[])
+    for i in range(0, len(text), size):
+        delta = SimpleNamespace(content=text[i : i + size])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class FakeClient:
+    """
+    OpenAI / AsyncOpenAI の偽物。chat.completions に任意のオブジェクトを差し込む。
+    `async with` で使え、抜けると closed が True になる。
+    """
+
+    def __init__(self, completions: Any) -> None:
+        self.chat = SimpleNamespace(completions=completions)
+        self.closed = False
+
+    async def __aenter__(self) -> "FakeClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.closed = True
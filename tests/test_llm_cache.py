@@ -0,0 +1,135 @@
+# tests/test_llm_cache.py
+# 目的: src/llm_cache.py（LLM 呼び出し結果のディスクキャッシュ）の単体テスト
+# LLM を呼ばないため OPENAI_API_KEY なしで実行できる
+
+import asyncio
+import os
+
+import pytest
+
+from src import llm_cache
+
+
+def _request(**overrides) -> dict:
+    request = {
+        "model": "gpt-5.1",
+        "messages": [{"role": "user", "content": "コースNo: TEST123"}],
+        "response_format": {"type": "json_object"},
+    }
+    request.update(overrides)
+    return request
+
+
+def test_request_key_is_stable():
+    """
+    キーの順序に依存せず、内容が変われば別のキーになること。
+    """
+    key = llm_cache.request_key(_request())
+    reordered = dict(reversed(list(_request().items())))
+
+    assert key == llm_cache.request_key(reordered)
+    assert len(key) == 32
+    assert key != llm_cache.request_key(_request(model="gpt-4o-mini"))
+
+
+def test_dumps_falls_back_for_large_ints():
+    # orjson が扱えない 64bit 超の整数は標準の json で同じコンパクト形式にする
+    assert llm_cache.dumps({"b": 10**20, "a": "太郎"}, sort_keys=True) == (
+        '{"a":"太郎","b":100000000000000000000}'.encode("utf-8")
+    )
+    assert llm_cache.dumps({"b": 1, "a": "太郎"}, sort_keys=True) == (
+        '{"a":"太郎","b":1}'.encode("utf-8")
+    )
+
+
+def test_request_key_accepts_large_ints():
+    # orjson が扱えない 64bit 超の整数でもキーを作れる（json にフォールバック）
+    assert llm_cache.request_key(_request(seed=2**70))
+
+
+def test_store_and_load_roundtrip():
+    value = {"courses": [{"courseNo": "TEST123", "nameJP": "太郎"}]}
+    llm_cache.store("k1", value)
+
+    assert llm_cache.load("k1") == value
+    assert llm_cache.load("missing") is None
+
+
+def test_store_leaves_no_temp_files():
+    llm_cache.store("k1", {"a": 1})
+    llm_cache.store("k1", {"a": 2})
+
+    names = sorted(p.name for p in llm_cache.cache_dir().iterdir())
+    assert names == [".lock", "k1.json"]
+    assert llm_cache.load("k1") == {"a": 2}
+
+
+def test_store_failure_removes_temp_file(monkeypatch):
+    def fail(src, dst):
+        raise OSError("replace failed")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        llm_cache.store("k1", {"a": 1})
+
+    assert [p.name for p in llm_cache.cache_dir().iterdir()] == [".lock"]
+
+
+def test_corrupt_entry_is_a_miss():
+    directory = llm_cache.cache_dir()
+    directory.mkdir(parents=True)
+    (directory / "k1.json").write_bytes(b'{"courses": [')
+
+    calls = []
+    result = llm_cache.cached_call("k1", lambda: calls.append(1) or {"ok": True})
+
+    assert result == {"ok": True}
+    assert calls == [1]
+    assert llm_cache.load("k1") == {"ok": True}
+
+
+def test_cached_call_calls_once():
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return {"ok": True}
+
+    assert llm_cache.cached_call("k1", fn) == {"ok": True}
+    assert llm_cache.cached_call("k1", fn) == {"ok": True}
+    assert calls == [1]
+
+
+def test_cached_call_async_calls_once():
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        return {"ok": True}
+
+    async def run():
+        return [await llm_cache.cached_call_async("k1", fn) for _ in range(2)]
+
+    assert asyncio.run(run()) == [{"ok": True}, {"ok": True}]
+    assert calls == [1]
+
+
+@pytest.mark.parametrize("value", ["0", "false", "No", " off "])
+def test_disabled_by_env(monkeypatch, value):
+    llm_cache.store("k1", {"a": 1})
+    monkeypatch.setenv("LAND_FNL_CACHE", value)
+
+    assert not llm_cache.enabled()
+    assert llm_cache.load("k1") is None
+
+    llm_cache.store("k2", {"a": 2})
+    calls = []
+    llm_cache.cached_call("k1", lambda: calls.append(1))
+    llm_cache.cached_call("k1", lambda: calls.append(1))
+
+    assert calls == [1, 1]
+    assert not (llm_cache.cache_dir() / "k2.json").exists()
+
+
+def test_enabled_by_default():
+    assert llm_cache.enabled()
@@ -0,0 +1,188 @@
+# tests/test_llm_extractor.py
+# 目的: src/llm_extractor.py のバッチ抽出（ストリーミング・id 対応づけ・フォールバック）の単体テスト
+# chat.completions.create を偽物に差し替えるため OPENAI_API_KEY なしで実行できる
+
+import asyncio
+
+import orjson
+
+from conftest import FakeClient, chat_response, chat_stream
+from src import llm_cache, llm_extractor
+
+
+def _blocks(n: int) -> list:
+    return [
+        {
+            "courseNo": f"C{i}",
+            "period": {"start": "2025-10-01", "end": "2025-10-05"},
+            "lines": [f"コースNo: C{i}"],
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def _course(course_no: str) -> dict:
+    return {"courseNo": course_no, "participants": []}
+
+
+def _batch_json(results: list) -> str:
+    return orjson.dumps({"results": results}).decode()
+
+
+class FakeAsyncCompletions:
+    """
+    stream=True のバッチ呼び出しには batch_text を流し、
+    それ以外（コース単位の再抽出）には {"courses": [FALLBACK]} を返す。
+    """
+
+    def __init__(self, batch_text: str) -> None:
+        self.batch_text = batch_text
+        self.batch_calls = 0
+        self.single_calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def create(self, stream: bool = False, **request):
+        if stream:
+            self.batch_calls += 1
+            return chat_stream(self.batch_text)
+
+        self.single_calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.active -= 1
+        return chat_response(orjson.dumps({"courses": [_course("FALLBACK")]}).decode())
+
+
+def _extract(blocks: list, completions: FakeAsyncCompletions, limit: int = 8) -> dict:
+    aclient = FakeClient(completions)
+
+    async def run() -> list:
+        sem = asyncio.Semaphore(limit)
+        return [
+            item
+            async for item in llm_extractor.extract_with_llm_batch_iter(
+                blocks, aclient, sem
+            )
+        ]
+
+    items = asyncio.run(run())
+    # 各ブロック番号はちょうど 1 回ずつ yield される
+    assert sorted(idx for idx, _ in items) == list(range(len(blocks)))
+    return dict(items)
+
+
+def _course_nos(results: dict) -> list:
+    return [results[i]["courses"][0]["courseNo"] for i in sorted(results)]
+
+
+def test_batch_entry():
+    assert llm_extractor._batch_entry({"id": 2, "courses": []}, 2) == (1, {"courses": []})
+    assert llm_extractor._batch_entry({"id": 0, "courses": []}, 2) is None
+    assert llm_extractor._batch_entry({"id": 3, "courses": []}, 2) is None
+    assert llm_extractor._batch_entry({"id": "1", "courses": []}, 2) is None
+    assert llm_extractor._batch_entry({"id": 1, "courses": {}}, 2) is None
+    assert llm_extractor._batch_entry(["id", 1], 2) is None
+
+
+def test_stream_yields_every_course_and_caches():
+    text = _batch_json(
+        [{"id": 2, "courses": [_course("C2")]}, {"id": 1, "courses": [_course("C1")]}]
+    )
+    completions = FakeAsyncCompletions(text)
+
+    results = _extract(_blocks(2), completions)
+
+    assert _course_nos(results) == ["C1", "C2"]
+    assert completions.single_calls == 0
+    assert len(list(llm_cache.cache_dir().glob("*.json"))) == 1
+
+
+def test_cache_hit_skips_the_api():
+    text = _batch_json(
+        [{"id": 1, "courses": [_course("C1")]}, {"id": 2, "courses": [_course("C2")]}]
+    )
+    _extract(_blocks(2), FakeAsyncCompletions(text))
+
+    completions = FakeAsyncCompletions("")
+    results = _extract(_blocks(2), completions)
+
+    assert _course_nos(results) == ["C1", "C2"]
+    assert completions.batch_calls == 0
+    assert completions.single_calls == 0
+
+
+def test_missing_id_is_re_extracted():
+    text = _batch_json([{"id": 1, "courses": [_course("C1")]}])
+    completions = FakeAsyncCompletions(text)
+
+    results = _extract(_blocks(2), completions)
+
+    assert _course_nos(results) == ["C1", "FALLBACK"]
+    assert completions.single_calls == 1
+    # id が欠けたバッチ結果は保存しない（再実行でもバッチを呼び直す）
+    cached = [orjson.loads(p.read_bytes()) for p in llm_cache.cache_dir().glob("*.json")]
+    assert all("results" not in c for c in cached)
+
+
+def test_batch_without_matching_ids_is_not_cached():
+    """
+    バッチ形式を無視した応答（{"courses": [...]} など）はキャッシュせず、
+    再実行では再びバッチ抽出を試みる。
+    """
+    for text in (_batch_json([]), orjson.dumps({"courses": [_course("C1")]}).decode()):
+        for _ in range(2):
+            completions = FakeAsyncCompletions(text)
+
+            results = _extract(_blocks(2), completions)
+
+            assert _course_nos(results) == ["FALLBACK", "FALLBACK"]
+            assert completions.batch_calls == 1
+        cached = [orjson.loads(p.read_bytes()) for p in llm_cache.cache_dir().glob("*.json")]
+        assert all("results" not in c for c in cached)
+
+
+def test_truncated_json_keeps_complete_results_and_is_not_cached():
+    text = _batch_json(
+        [{"id": 1, "courses": [_course("C1")]}, {"id": 2, "courses": [_course("C2")]}]
+    )
+    truncated = text[: text.index('{"id":2')] + '{"id":2,"cour'
+    completions = FakeAsyncCompletions(truncated)
+
+    results = _extract(_blocks(3), completions)
+
+    assert _course_nos(results) == ["C1", "FALLBACK", "FALLBACK"]
+    assert completions.single_calls == 2
+    # 壊れたバッチ結果は保存しない（保存されるのは個別抽出の結果のみ）
+    cached = [orjson.loads(p.read_bytes()) for p in llm_cache.cache_dir().glob("*.json")]
+    assert all("results" not in c for c in cached)
+
+
+def test_duplicate_and_out_of_range_ids_are_ignored():
+    text = _batch_json(
+        [
+            {"id": 1, "courses": [_course("C1")]},
+            {"id": 1, "courses": [_course("DUP")]},
+            {"id": 5, "courses": [_course("OUT")]},
+            {"id": 0, "courses": [_course("ZERO")]},
+        ]
+    )
+    completions = FakeAsyncCompletions(text)
+
+    results = _extract(_blocks(2), completions)
+
+    assert _course_nos(results) == ["C1", "FALLBACK"]
+    assert completions.single_calls == 1
+
+
+def test_fallback_respects_the_semaphore():
+    completions = FakeAsyncCompletions("{")
+
+    results = _extract(_blocks(4), completions, limit=2)
+
+    assert _course_nos(results) == ["FALLBACK"] * 4
+    assert completions.single_calls == 4
+    assert completions.max_active == 2
@@ -0,0 +1,101 @@
+# tests/test_llm_validator.py
+# 目的: src/llm_validator.py（Step3b 意味検証）の単体テスト
+# chat.completions.create を偽物に差し替えるため OPENAI_API_KEY なしで実行できる
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import FakeClient, chat_response
+from src import llm_cache, llm_validator
+
+
+BLOCK = {
+    "courseNo": "TEST123",
+    "period": {"start": "2025-10-01", "end": "2025-10-05"},
+    "lines": ["コースNo: TEST123", "特別依頼: 11月に入籍予定のためハネムーン"],
+}
+EXTRACTED = {
+    "courses": [
+        {
+            "courseNo": "TEST123",
+            "period": {"start": "2025-10-01", "end": "2025-10-05"},
+            "participants": [{"no": 1, "nameJP": "太郎"}],
+        }
+    ]
+}
+
+
+class FakeCompletions:
+    def __init__(self, response: SimpleNamespace) -> None:
+        self.response = response
+        self.calls = 0
+
+    def create(self, **request):
+        self.calls += 1
+        return self.response
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, **request):
+        self.calls += 1
+        return self.response
+
+
+def test_review_is_parsed_and_cached(monkeypatch):
+    completions = FakeCompletions(chat_response('{"ok": true, "errors": [], "warnings": []}'))
+    monkeypatch.setattr(llm_validator, "client", FakeClient(completions))
+
+    for _ in range(2):
+        review = llm_validator.validate_semantic_with_llm(BLOCK, EXTRACTED)
+        assert review == {"ok": True, "errors": [], "warnings": []}
+    assert completions.calls == 1
+
+
+def test_truncated_review_is_not_fatal(monkeypatch):
+    """
+    出力が上限で打ち切られても例外にせず、ok=False の警告を返し、キャッシュもしない。
+    """
+    completions = FakeCompletions(chat_response('{"ok": false, "errors": [{"co', "length"))
+    monkeypatch.setattr(llm_validator, "client", FakeClient(completions))
+
+    for _ in range(2):
+        review = llm_validator.validate_semantic_with_llm(BLOCK, EXTRACTED)
+        assert review["ok"] is False
+        assert review["errors"] == []
+        assert [w["code"] for w in review["warnings"]] == ["WARN_REVIEW_TRUNCATED"]
+    assert completions.calls == 2
+    assert not list(llm_cache.cache_dir().glob("*.json"))
+
+
+def test_truncated_review_is_not_fatal_async():
+    completions = FakeAsyncCompletions(chat_response("", "length"))
+
+    review = asyncio.run(
+        llm_validator.validate_semantic_with_llm_async(
+            BLOCK, EXTRACTED, FakeClient(completions)
+        )
+    )
+
+    assert review["ok"] is False
+    assert [w["code"] for w in review["warnings"]] == ["WARN_REVIEW_TRUNCATED"]
+
+
+def test_empty_review_is_still_an_error(monkeypatch):
+    completions = FakeCompletions(chat_response(""))
+    monkeypatch.setattr(llm_validator, "client", FakeClient(completions))
+
+    with pytest.raises(RuntimeError):
+        llm_validator.validate_semantic_with_llm(BLOCK, EXTRACTED)
+
+
+def test_prompt_accepts_large_ints():
+    """
+    64bit を超える整数（"no" の数値化など）を含む抽出結果でもプロンプトを組み立てられる。
+    """
+    extracted = {"courses": [{"courseNo": "TEST123", "participants": [{"no": 10**20}]}]}
+
+    prompt = llm_validator.build_validation_prompt(BLOCK, extracted)
+
+    assert '{"courses":[{"courseNo":"TEST123","participants":[{"no":100000000000000000000}]}]}' in prompt
@@ -0,0 +1,118 @@
+# tests/test_normalizer.py
+# 目的: src/normalizer.py（Step0 正規化・コース単位ブロック化）の単体テスト
+
+import io
+import random
+
+import pytest
+
+from src.normalizer import find_course_blocks, iter_normalized_lines, normalize_lines
+
+
+def _stream(s: str) -> list:
+    # main() と同じく改行コードを統一して 1 行ずつ読む
+    return list(iter_normalized_lines(io.StringIO(s, newline=None)))
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        "コースNo: ABC123\r\n2025-09-01〜2025-09-05\r\n氏名 太郎\r\n",
+        "一行目\r二行目\r\r三行目",
+        "混在\r\n改行\n\r\n末尾\r",
+        "全角　スペース　　の　圧縮\n\tタブ\t\t区切り \t 混在　\n",
+        "ＡＢＣ１２３　コースＮｏ：ＸＹＺ\n",
+        "----\n  ____  \n====\n---\n-- --\n----- 本文付き\n　＝＝＝＝　\n",
+        "Page 1/3\n  page 2/3 フッタ  \nＰａｇｅ ３/３\nPage1/3\nPage x/y\n",
+        "",
+        "\n\r\n  \n　\n",
+        "最終行に改行なし",
+    ],
+)
+def test_iter_normalized_lines_matches_normalize_lines(raw):
+    assert _stream(raw) == normalize_lines(raw)
+
+
+def test_iter_normalized_lines_matches_normalize_lines_random():
+    """
+    改行・空白・装飾線・ページ表記の断片を組み合わせたランダム入力で、
+    全文版と逐次版の結果が一致すること（乱数は固定）。
+    """
+    pieces = [
+        "\n", "\r", "\r\n", " ", "  ", "\t", "　", "-", "----", "_", "=", "＝＝＝＝",
+        "Page 1/2", "page 10/20", "Ｐａｇｅ", " 3/4", "コースNo: A1", "太郎", "ＡＢＣ", "x",
+    ]
+    rng = random.Random(20251014)
+    for _ in range(2000):
+        raw = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 30)))
+        assert _stream(raw) == normalize_lines(raw), repr(raw)
+
+
+def test_find_course_blocks_splits_courses():
+    lines = [
+        "ヘッダ行",
+        "コースNo: ABC123",
+        "2025-09-01〜2025-09-05",
+        "氏名 太郎",
+        "Course: XYZ-9",
+        "2025-10-01〜2025-10-03",
+    ]
+
+    blocks = find_course_blocks(lines)
+
+    assert [b["courseNo"] for b in blocks] == ["ABC123", "XYZ-9"]
+    # courseNo が見つかる前のヘッダ行はどのブロックにも入らない
+    assert blocks[0]["lines"] == lines[1:4]
+    assert blocks[1]["lines"] == lines[4:]
+    assert blocks[1]["period"] == {"start": "2025-10-01", "end": "2025-10-03"}
+
+
+def test_find_course_blocks_keeps_first_period():
+    """
+    period はコース内で最初に見つかった日付範囲。便名・OP の日付行では上書きしない。
+    """
+    lines = [
+        "コースNo: ABC123",
+        "2025-09-01〜2025-09-05",
+        "NH203 2025-09-01 成田 → 2025-09-01 フランクフルト",
+        "OP: 2025-09-03〜2025-09-04 ライン川クルーズ",
+    ]
+
+    (block,) = find_course_blocks(lines)
+
+    assert block["period"] == {"start": "2025-09-01", "end": "2025-09-05"}
+    assert block["lines"] == lines
+
+
+def test_find_course_blocks_period_after_course_line():
+    # コース行より前の日付は採用しない（ヘッダの発行日など）
+    lines = ["発行日 2025-08-01〜2025-08-02", "コースNo: ABC123", "氏名 太郎"]
+
+    (block,) = find_course_blocks(lines)
+
+    assert block["period"] == {"start": "", "end": ""}
+
+
+def test_find_course_blocks_needs_course_keyword():
+    """
+    「コ」も「C」も含まない行はブロックを開始しない。
+    """
+    lines = [
+        "course: ABC123",
+        "No: ABC123",
+        "ｺｰｽNo: ABC123",
+        "番号: ABC123 2025-09-01〜2025-09-05",
+    ]
+
+    assert find_course_blocks(lines) == []
+
+
+def test_find_course_blocks_empty():
+    assert find_course_blocks([]) == []
+    assert find_course_blocks(iter(["コースNo: ABC123"])) == [
+        {
+            "courseNo": "ABC123",
+            "period": {"start": "", "end": ""},
+            "lines": ["コースNo: ABC123"],
+        }
+    ]
@@ -0,0 +1,192 @@
+# tests/test_pipeline.py
+# 目的: src/pipeline.py（抽出〜検証の並列実行・入力順の維持・エラー処理）の単体テスト
+# pipeline.new_async_client を偽物に差し替えるため OPENAI_API_KEY なしで実行できる
+
+import asyncio
+
+import orjson
+import pytest
+
+from conftest import FakeClient, chat_response, chat_stream
+from src import pipeline
+
+COURSE_NOS = ["AAA1", "BBB2", "CCC3"]
+
+RAW = "\n".join(
+    f"コースNo: {no}\n2025-10-01〜2025-10-05\n参加者 太郎" for no in COURSE_NOS
+)
+
+OK_REVIEW = '{"ok": true, "errors": [], "warnings": []}'
+
+
+def _course(course_no: str, participants: bool = True) -> dict:
+    return {
+        "courseNo": course_no,
+        "period": {"start": "2025-10-01", "end": "2025-10-05"},
+        "participants": (
+            [{"no": 1, "nameJP": "太郎", "nameEN": "TARO", "inquiryNo": "Q1"}]
+            if participants
+            else []
+        ),
+    }
+
+
+def _review_course_no(request: dict) -> str:
+    prompt = request["messages"][-1]["content"]
+    return next(no for no in COURSE_NOS if no in prompt)
+
+
+class FakePipelineCompletions:
+    """
+    stream=True のバッチ抽出には order の順（id は 1 始まり）で結果を流し、
+    意味検証の呼び出しには review(course_no) の結果を返す。
+    """
+
+    def __init__(self, order=(1, 2, 3), empty=(), review=None) -> None:
+        self.order = order
+        self.empty = set(empty)
+        self.review = review
+        self.reviewed = []
+
+    async def create(self, stream: bool = False, **request):
+        if stream:
+            results = [
+                {"id": i, "courses": [_course(COURSE_NOS[i - 1], i not in self.empty)]}
+                for i in self.order
+            ]
+            return chat_stream(orjson.dumps({"results": results}).decode())
+
+        course_no = _review_course_no(request)
+        self.reviewed.append(course_no)
+        if self.review is not None:
+            return chat_response(await self.review(course_no))
+        return chat_response(OK_REVIEW)
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """
+    pipeline.new_async_client を、completions を差し込んだ FakeClient を返すものに替える。
+    作られたクライアントは返り値のリストに溜まる。
+    """
+    created = []
+
+    def install(completions):
+        def factory():
+            client = FakeClient(completions)
+            created.append(client)
+            return client
+
+        monkeypatch.setattr(pipeline, "new_async_client", factory)
+        return created
+
+    return install
+
+
+def test_output_follows_input_order(clients):
+    # 抽出結果は 3 → 1 → 2 の順に届き、意味検証も後のコースほど早く終わる
+    async def review(course_no):
+        await asyncio.sleep(0.01 * (3 - COURSE_NOS.index(course_no)))
+        return OK_REVIEW
+
+    completions = FakePipelineCompletions(order=(3, 1, 2), review=review)
+    created = clients(completions)
+
+    text = pipeline.process_text(RAW)
+
+    positions = [text.index(f"コースNo: {no}") for no in COURSE_NOS]
+    assert positions == sorted(positions)
+    assert sorted(completions.reviewed) == COURSE_NOS
+    assert len(created) == 1 and created[0].closed
+
+
+def test_first_failure_in_input_order_is_raised(clients):
+    # BBB2 / CCC3 が失敗し、CCC3 の方が先に失敗する
+    async def review(course_no):
+        if course_no == "BBB2":
+            await asyncio.sleep(0.05)
+            raise ConnectionError("BBB2 failed")
+        if course_no == "CCC3":
+            raise ConnectionError("CCC3 failed")
+        return OK_REVIEW
+
+    clients(FakePipelineCompletions(review=review))
+
+    with pytest.raises(RuntimeError, match="for course BBB2"):
+        pipeline.process_text(RAW)
+
+
+class FailingStreamCompletions(FakePipelineCompletions):
+    """
+    1 コース分を流した後、ストリームの途中で接続エラーになる。
+    意味検証は終わらずに待ち続け、キャンセルされたコースを記録する。
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.cancelled = []
+
+    async def create(self, stream: bool = False, **request):
+        if not stream:
+            course_no = _review_course_no(request)
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                self.cancelled.append(course_no)
+                raise
+            return chat_response(OK_REVIEW)
+
+        async def broken():
+            text = orjson.dumps({"results": [{"id": 1, "courses": [_course("AAA1")]}]})
+            async for chunk in chat_stream(text.decode()[:-2]):
+                yield chunk
+            await asyncio.sleep(0.01)  # 検証タスクが走り始めるのを待つ
+            raise ConnectionError("stream broken")
+
+        return broken()
+
+
+def test_pending_validations_are_cancelled_when_extraction_fails(clients):
+    completions = FailingStreamCompletions()
+    created = clients(completions)
+
+    with pytest.raises(ConnectionError, match="stream broken"):
+        pipeline.process_text(RAW)
+
+    assert completions.cancelled == ["AAA1"]
+    assert created[0].closed
+
+
+def test_course_without_participants_skips_review(clients, capsys):
+    completions = FakePipelineCompletions(empty={2})
+    clients(completions)
+
+    text = pipeline.process_text(RAW)
+
+    assert "コースNo: BBB2" in text
+    assert sorted(completions.reviewed) == ["AAA1", "CCC3"]
+    assert "[Course: BBB2] ok = True" in capsys.readouterr().err
+
+
+def test_process_text_runs_twice_in_one_process(clients, monkeypatch):
+    """
+    asyncio.run ごとに新しい非同期クライアントを作って閉じる（ループをまたいで共有しない）。
+    """
+    monkeypatch.setenv("LAND_FNL_CACHE", "0")
+    completions = FakePipelineCompletions()
+    created = clients(completions)
+
+    first = pipeline.process_text(RAW)
+    second = pipeline.process_text(RAW)
+
+    assert first == second
+    assert len(created) == 2 and created[0] is not created[1]
+    assert all(c.closed for c in created)
+    assert len(completions.reviewed) == 6
+
+
+def test_empty_input_makes_no_client(clients):
+    created = clients(FakePipelineCompletions())
+
+    assert pipeline.process_text("ヘッダのみ\n") == ""
+    assert created == []
@@ -0,0 +1,23 @@
+# tests/test_safety.py
+# 目的: src/safety.py（禁則ワードチェック）の単体テスト
+
+from src import safety
+
+
+def test_scan_ng_terms():
+    assert safety.scan_ng_terms("座席 窓側 希望 / 保険は不要 / JR 利用") == {"座席", "保険", "JR"}
+    assert safety.scan_ng_terms("並び席を希望") == {"並び席"}
+    assert safety.scan_ng_terms("JRA の馬券") == set()
+    assert safety.scan_ng_terms("") == set()
+
+
+def test_wrappers_agree_with_scan():
+    for text in ("座席 窓側 希望 / 保険は不要", "JR で移動", "ハネムーン", "保険 保険 旅券"):
+        hits = safety.scan_ng_terms(text)
+        assert safety.contains_ng_terms(text) is bool(hits)
+        assert set(safety.find_all_ng_terms(text)) == hits
+
+
+def test_find_all_ng_terms_pattern_order():
+    # 出現順ではなく NG_PATTERNS の順に 1 件ずつ
+    assert safety.find_all_ng_terms("JR / 保険 / 座席 / 保険") == ["座席", "保険", "JR"]
@@ -0,0 +1,140 @@
+# tests/test_validator.py
+# 目的: src/validator.py（スキーマ検証・正規化）の単体テスト
+# LLM を呼ばないため OPENAI_API_KEY なしで実行できる
+
+import pytest
+from jsonschema import ValidationError
+
+from src import validator
+
+
+def _valid_doc() -> dict:
+    return {
+        "courses": [
+            {
+                "courseNo": "TEST123",
+                "period": {"start": "2025-10-01", "end": "2025-10-05"},
+                "participants": [
+                    {
+                        "no": 1,
+                        "nameJP": "太郎",
+                        "nameEN": "TARO",
+                        "inquiryNo": "Q1",
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def test_canonical_symbols():
+    """
+    validator.py は 1 つだけで、正規化・検証の公開関数がそろっていること。
+    """
+    for name in (
+        "normalize_course_structure",
+        "clean_optionalrq_status",
+        "normalize_text_fields",
+        "normalize_gear_sizes",
+        "coerce_numeric_fields",
+        "validate_schema",
+        "is_schema_valid",
+        "load_schema",
+    ):
+        assert callable(getattr(validator, name))
+
+
+def test_extractor_uses_validator_schema():
+    """
+    抽出の response_format と検証が同じスキーマ（validator.load_schema）から作られること。
+    """
+    from src import llm_extractor
+
+    schema = validator.load_schema()
+    assert schema
+    assert llm_extractor._response_format()["json_schema"]["schema"] is schema
+
+
+def test_validate_schema_normalizes_llm_output():
+    """
+    LLM が返しがちなゆがみ（期間の別名・文字列の数値・status・list の文字列
+    フィールド・airline の別名キー・dict 以外の gearSizes）が補正されて検証を通ること。
+    """
+    doc = {
+        "courses": [
+            {
+                "courseNo": "TEST123",
+                "periodFrom": "2025-10-01",
+                "periodTo": "2025-10-05",
+                "participants": [
+                    {
+                        "no": "01",
+                        "nameJP": "太郎",
+                        "nameEN": "TARO",
+                        "inquiryNo": "Q1",
+                        "optionalRQ": [{"name": "OP", "status": "RQ", "pax": "2"}],
+                        "medical": ["車椅子", "", "歩行配慮"],
+                        "airline": {"assistance": "WCHR", "luggage": ["杖"], "other": "x"},
+                        "gearSizes": [],
+                    }
+                ],
+            }
+        ]
+    }
+
+    validator.validate_schema(doc)
+
+    course = doc["courses"][0]
+    assert course["period"] == {"start": "2025-10-01", "end": "2025-10-05"}
+    assert "periodFrom" not in course and "periodTo" not in course
+
+    p = course["participants"][0]
+    assert p["no"] == 1
+    assert p["optionalRQ"] == [{"name": "OP", "pax": 2}]
+    assert p["medical"] == "車椅子 / 歩行配慮"
+    assert p["airline"] == {"assist": "WCHR", "carryOn": "杖"}
+    assert p["gearSizes"] == {}
+
+
+def test_normalize_is_idempotent():
+    """
+    検証前の正規化は 2 回かけても結果が変わらないこと。
+    """
+    doc = _valid_doc()
+    doc["courses"][0]["participants"][0]["optionalRQ"] = [{"name": "OP", "pax": "3"}]
+
+    validator.validate_schema(doc)
+    once = repr(doc)
+    validator.validate_schema(doc)
+    assert repr(doc) == once
+
+
+def test_invalid_document_is_reported():
+    """
+    スキーマ違反は validate_schema では ValidationError、
+    is_schema_valid では (False, メッセージ) になること。
+    """
+    doc = _valid_doc()
+    doc["courses"][0]["period"]["start"] = "2025/10/01"
+
+    with pytest.raises(ValidationError):
+        validator.validate_schema(doc)
+
+    ok, msg = validator.is_schema_valid(doc)
+    assert ok is False
+    assert "2025/10/01" in msg
+
+
+def test_is_schema_valid_accepts_valid_document():
+    assert validator.is_schema_valid(_valid_doc()) == (True, None)
+
+
+def test_non_decimal_digits_are_left_as_is():
+    """
+    isdigit では True になるが int() できない文字列（上付き数字など）は変換しないこと。
+    """
+    doc = _valid_doc()
+    doc["courses"][0]["participants"][0]["no"] = "²"
+
+    validator.coerce_numeric_fields(doc)
+    assert doc["courses"][0]["participants"][0]["no"] == "²"